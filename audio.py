@@ -0,0 +1,132 @@
+"""Etapas de audio en proceso sobre frames PCM, vectorizadas con NumPy"""
+import functools
+
+import discord
+import numpy as np
+
+# Un frame de discord.py: 20 ms de PCM s16le estéreo a 48 kHz
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+FRAME_SAMPLES = FRAME_SIZE // 2
+CHANNELS = 2
+# Duración de la rampa al cambiar el volumen, para evitar chasquidos
+GAIN_RAMP_FRAMES = 3
+
+
+class GainTransformer(discord.AudioSource):
+    """Aplica ganancia a un AudioSource PCM sobre buffers preasignados
+
+    Sustituye a PCMVolumeTransformer (basado en audioop, eliminado en Python 3.13).
+    Los cambios de volumen se aplican con una rampa lineal de GAIN_RAMP_FRAMES frames.
+    """
+
+    def __init__(self, original, volume=1.0):
+        if original.is_opus():
+            raise discord.ClientException('GainTransformer necesita una fuente PCM')
+        self.original = original
+        self._gain = max(volume, 0.0)
+        self._target = self._gain
+        self._step = 0.0
+        self._work = np.empty(FRAME_SAMPLES, dtype=np.float32)
+        self._ramp = np.empty(FRAME_SAMPLES, dtype=np.float32)
+        self._out = np.empty(FRAME_SAMPLES, dtype=np.int16)
+        # Rampa 0→1 por muestra, con el mismo valor para los dos canales de cada instante
+        self._unit_ramp = np.repeat(
+            np.arange(1, FRAME_SAMPLES // CHANNELS + 1, dtype=np.float32) / (FRAME_SAMPLES // CHANNELS),
+            CHANNELS,
+        )
+
+    @property
+    def volume(self):
+        return self._target
+
+    @volume.setter
+    def volume(self, value):
+        value = max(value, 0.0)
+        self._step = abs(value - self._gain) / GAIN_RAMP_FRAMES
+        self._target = value
+
+    def read(self):
+        data = self.original.read()
+        if not data:
+            return data
+        start, target = self._gain, self._target
+        if start == target == 1.0:
+            return data
+
+        samples = np.frombuffer(data, dtype=np.int16)
+        count = len(samples)
+        if count == FRAME_SAMPLES:
+            work, out = self._work, self._out
+        else:
+            # Último frame incompleto: vistas sobre los mismos buffers
+            work, out = self._work[:count], self._out[:count]
+        if start == target:
+            np.multiply(samples, start, out=work, dtype=np.float32, casting='unsafe')
+            peak = start
+        else:
+            # Avanzar hacia el objetivo como máximo `step` por frame
+            end = min(target, start + self._step) if target > start else max(target, start - self._step)
+            ramp = self._ramp if count == FRAME_SAMPLES else self._ramp[:count]
+            np.multiply(self._unit_ramp[:count], end - start, out=ramp)
+            ramp += start
+            np.multiply(samples, ramp, out=work, casting='unsafe')
+            self._gain = end
+            peak = max(start, end)
+        # Con ganancia <= 1 no puede haber desbordamiento: se evita el clip
+        if peak > 1.0:
+            np.clip(work, -32768, 32767, out=work)
+        np.copyto(out, work, casting='unsafe')
+        return out.tobytes()
+
+    def cleanup(self):
+        self.original.cleanup()
+
+
+@functools.lru_cache(maxsize=4)
+def _equal_power_curves(frames):
+    """Ganancias (entrada, salida) de un fundido de `frames` frames, una fila por frame
+
+    Solo dependen de la duración del fundido: los Crossfader de todos los servidores
+    comparten las mismas (de solo lectura).
+    """
+    steps = frames * (FRAME_SAMPLES // CHANNELS)
+    phase = np.arange(1, steps + 1, dtype=np.float64) * (np.pi / 2 / steps)
+    curves = []
+    for gain in (np.sin(phase), np.cos(phase)):
+        # Mismo valor para los dos canales de cada instante, ya intercalado como el PCM
+        gain = np.repeat(gain.astype(np.float32), CHANNELS).reshape(frames, FRAME_SAMPLES)
+        gain.flags.writeable = False
+        curves.append(gain)
+    return tuple(curves)
+
+
+class Crossfader:
+    """Fundido de igual potencia de `frames` frames PCM completos, sobre buffers preasignados
+
+    Las curvas de ganancia se calculan una sola vez para todo el fundido: cada
+    frame solo toma su fila, sin calcular senos ni cosenos.
+    """
+
+    def __init__(self, frames):
+        self.frames = max(1, frames)
+        self._gain_in, self._gain_out = _equal_power_curves(self.frames)
+        self._work = np.empty(FRAME_SAMPLES, dtype=np.float32)
+        self._incoming = np.empty(FRAME_SAMPLES, dtype=np.float32)
+        self._out = np.empty(FRAME_SAMPLES, dtype=np.int16)
+
+    def mix(self, outgoing, incoming, index):
+        """Mezcla dos frames en el frame `index` (desde 0) del fundido
+
+        `incoming` vacío cuenta como silencio: la pista saliente se sigue atenuando.
+        """
+        index = min(index, self.frames - 1)
+        work = self._work
+        np.multiply(np.frombuffer(outgoing, dtype=np.int16), self._gain_out[index], out=work, casting='unsafe')
+        if incoming:
+            np.multiply(np.frombuffer(incoming, dtype=np.int16), self._gain_in[index], out=self._incoming,
+                        casting='unsafe')
+            work += self._incoming
+            # Dos señales a plena escala pueden sumar más de lo que cabe en 16 bits
+            np.clip(work, -32768, 32767, out=work)
+        np.copyto(self._out, work, casting='unsafe')
+        return self._out.tobytes()
@@ -0,0 +1,161 @@
+"""Caché local de audio en disco (Ogg Opus) para las canciones que más se repiten"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+# Canciones más largas no se guardan (directos, mixes de horas...)
+DEFAULT_MAX_DURATION = 20 * 60
+FILL_BITRATE = '128k'
+# Nombre con el que las descargas de caché compiten por huecos en el FFmpegScheduler
+SCHEDULER_KEY = 'audio-cache'
+
+
+class AudioCache:
+    """Archivos .opus direccionados por contenido (extractor + id) con presupuesto en bytes
+
+    Se desaloja por LRU usando la fecha de modificación como último acceso. Cada
+    archivo se escribe primero con un nombre temporal y se renombra al terminar,
+    así que nunca se reproduce un archivo a medias.
+    """
+
+    def __init__(self, directory='audio_cache', *, max_bytes=DEFAULT_MAX_BYTES,
+                 max_duration=DEFAULT_MAX_DURATION, executable='ffmpeg', scheduler=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_duration = max_duration
+        self.executable = executable
+        self.scheduler = scheduler
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.fill_errors = 0
+        self.evictions = 0
+        self._filling = {}
+        self._index = {}
+        self._total = 0
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+
+    @property
+    def enabled(self):
+        return bool(self.directory) and self.max_bytes > 0
+
+    def _scan(self):
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.opus'):
+                # Restos de escrituras interrumpidas
+                if '.tmp-' in entry.name:
+                    os.unlink(entry.path)
+                continue
+            stat = entry.stat()
+            self._index[entry.path] = [stat.st_size, stat.st_mtime]
+            self._total += stat.st_size
+
+    def path_for(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{digest}.opus')
+
+    def apply(self, track):
+        """Si la pista está en caché, la apunta al archivo local y devuelve True"""
+        if not self.enabled or not track.video_id:
+            return False
+        path = self.path_for(track.key)
+        entry = self._index.get(path)
+        if entry is None or not os.path.exists(path):
+            if entry is not None:
+                # Borrado desde fuera: deja de contar en el tamaño, como al desalojarlo
+                del self._index[path]
+                self._total -= entry[0]
+            self.misses += 1
+            return False
+        now = time.time()
+        os.utime(path, (now, now))
+        entry[1] = now
+        track.local_path = path
+        self.hits += 1
+        return True
+
+    def schedule_fill(self, track):
+        """Guarda la pista en segundo plano tras su primera reproducción"""
+        if not self.enabled or not track.video_id or track.is_local:
+            return
+        if not track.is_stream_valid():
+            return
+        if not track.duration or track.duration > self.max_duration:
+            return
+        key = track.key
+        if key in self._filling or self.path_for(key) in self._index:
+            return
+        task = asyncio.ensure_future(self._fill(key, track.stream_url, track.acodec))
+        self._filling[key] = task
+        task.add_done_callback(lambda _: self._filling.pop(key, None))
+
+    async def _fill(self, key, stream_url, acodec):
+        path = self.path_for(key)
+        tmp_path = f'{path}.tmp-{os.getpid()}-{id(self)}'
+        slot = None
+        if self.scheduler is not None:
+            slot = await self.scheduler.acquire(SCHEDULER_KEY)
+        try:
+            codec = ['-c:a', 'copy'] if acodec == 'opus' else ['-c:a', 'libopus', '-b:a', FILL_BITRATE]
+            process = await asyncio.create_subprocess_exec(
+                self.executable, '-hide_banner', '-loglevel', 'error', '-nostdin',
+                '-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5',
+                '-i', stream_url, '-vn', '-map_metadata', '-1', *codec, '-f', 'opus', tmp_path,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                _, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                process.kill()
+                raise
+            if process.returncode != 0 or not os.path.getsize(tmp_path):
+                raise OSError(stderr.decode(errors='replace').strip() or f'FFmpeg salió con {process.returncode}')
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.fill_errors += 1
+            log.warning('No se pudo guardar en la caché de audio %s: %s', key, e)
+            return
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            if slot is not None:
+                slot.release()
+
+        size = os.path.getsize(path)
+        replaced = self._index.get(path)
+        if replaced is not None:
+            self._total -= replaced[0]
+        self._index[path] = [size, time.time()]
+        self._total += size
+        self.fills += 1
+        self._evict()
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        # Menos usados primero
+        for path, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            del self._index[path]
+            self._total -= size
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            'entries': len(self._index), 'bytes': self._total, 'max_bytes': self.max_bytes,
+            'hits': self.hits, 'misses': self.misses, 'fills': self.fills,
+            'fill_errors': self.fill_errors, 'filling': len(self._filling),
+            'evictions': self.evictions,
+        }
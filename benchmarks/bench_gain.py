@@ -0,0 +1,82 @@
+"""Micro-benchmark: frames/s de GainTransformer frente a PCMVolumeTransformer, y del fundido del mixer
+
+Uso: python benchmarks/bench_gain.py [segundos]
+"""
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+import numpy as np
+
+from audio import FRAME_SAMPLES, Crossfader, GainTransformer
+
+
+class ConstantSource(discord.AudioSource):
+    """Devuelve siempre el mismo frame PCM, sin coste de E/S"""
+
+    def __init__(self):
+        rng = np.random.default_rng(0)
+        self.frame = rng.integers(-20000, 20000, FRAME_SAMPLES, dtype=np.int16).tobytes()
+
+    def read(self):
+        return self.frame
+
+
+class CrossfadeSource:
+    """Fundido continuo entre dos fuentes, como el del mixer durante un cambio de canción"""
+
+    def __init__(self, frames=250):
+        self.outgoing = ConstantSource()
+        self.incoming = ConstantSource()
+        self.fader = Crossfader(frames)
+        self.frames = frames
+        self.done = 0
+
+    def read(self):
+        index = self.done
+        self.done = (self.done + 1) % self.frames
+        return self.fader.mix(self.outgoing.read(), self.incoming.read(), index)
+
+
+def measure(source, seconds, toggle_volume=False):
+    frames = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(500):
+            if toggle_volume and frames % 50 == 0:
+                source.volume = 0.3 if source.volume > 0.5 else 0.9
+            source.read()
+            frames += 1
+    return frames / seconds
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    # Tiempo real = 50 frames/s por stream
+    print(f"{'transformador':<28}{'frames/s':>12}{'streams en tiempo real':>26}")
+    cases = [
+        ('GainTransformer', lambda: GainTransformer(ConstantSource(), volume=0.8), False),
+        ('GainTransformer (rampas)', lambda: GainTransformer(ConstantSource(), volume=0.8), True),
+        ('Crossfader', CrossfadeSource, False),
+    ]
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            import audioop  # noqa: F401  (eliminado en Python 3.13)
+        cases.insert(0, ('PCMVolumeTransformer', lambda: discord.PCMVolumeTransformer(ConstantSource(), volume=0.8), False))
+    except ImportError:
+        print('audioop no disponible: se omite PCMVolumeTransformer')
+
+    for name, factory, toggle in cases:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            rate = measure(factory(), seconds, toggle)
+        print(f'{name:<28}{rate:>12,.0f}{rate / 50:>26,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Memoria por canción: dict de canción original frente a Song + ResolvedTrack
+
+Uso: python benchmarks/bench_memory.py
+
+Mide con tracemalloc (bytes asignados) y RSS (/proc) el coste de 1000 canciones
+en cola y de 100 servidores reproduciendo, con un diccionario de yt-dlp sintético
+de tamaño realista (formatos, miniaturas, cabeceras, descripción). La referencia
+es el dict de canción que guardaba la cola original; las URLs de stream de las
+canciones en cola se miden aparte, en la caché de streams de MediaCache.
+"""
+import gc
+import os
+import sys
+import tracemalloc
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+
+from cache import MediaCache
+from ffmpeg_scheduler import process_usage
+from music_queue import MusicQueue, Song
+from player import TrackPlayer
+from tracks import ResolvedTrack, format_duration
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-us,en;q=0.5',
+    'Sec-Fetch-Mode': 'navigate',
+}
+
+
+def fake_info(i):
+    """Diccionario con la forma y el tamaño aproximados de extract_info de YouTube"""
+    video_id = f'{i:011d}'
+    stream = f'https://rr{i % 9}---sn-abc.googlevideo.com/videoplayback?expire=1900000000&id={video_id}&' + 'x' * 900
+    formats = [{
+        'format_id': str(100 + f), 'url': stream + str(f), 'ext': 'webm', 'acodec': 'opus', 'vcodec': 'none',
+        'abr': 128, 'asr': 48000, 'filesize': 3_000_000 + f, 'http_headers': dict(HEADERS),
+        'downloader_options': {'http_chunk_size': 10485760}, 'format_note': 'medium', 'protocol': 'https',
+    } for f in range(25)]
+    thumbnails = [{'url': f'https://i.ytimg.com/vi/{video_id}/{t}.jpg', 'id': str(t), 'height': 90 * t, 'width': 160 * t}
+                  for t in range(40)]
+    return {
+        'id': video_id, 'title': f'Canción {i}', 'webpage_url': f'https://www.youtube.com/watch?v={video_id}',
+        'extractor_key': 'Youtube', 'duration': 215, 'thumbnail': thumbnails[-1]['url'],
+        'description': 'Letra y créditos. ' * 120, 'tags': [f'tag{t}' for t in range(30)],
+        'formats': formats, 'thumbnails': thumbnails, 'http_headers': dict(HEADERS),
+        'url': stream, 'ext': 'webm', 'acodec': 'opus', 'abr': 128,
+    }
+
+
+class SilentSource(discord.AudioSource):
+    def read(self):
+        return b''
+
+
+class IdlePlayer(TrackPlayer):
+    """TrackPlayer sin FFmpeg: solo cuenta la memoria del objeto y su pista"""
+
+    def _create_source(self, position):
+        return SilentSource()
+
+
+def measure(build):
+    gc.collect()
+    rss_before = process_usage(os.getpid())
+    tracemalloc.start()
+    objects = build()
+    # urlsplit guarda en caché las últimas URLs parseadas (parse_expiry): coste fijo, no por canción
+    urllib.parse.clear_cache()
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = process_usage(os.getpid())
+    rss = rss_after[1] - rss_before[1] if rss_before and rss_after else None
+    del objects
+    gc.collect()
+    return allocated, rss
+
+
+def queued_info(count):
+    # Antes de las pistas resueltas, lo que sobrevivía por canción era el info completo
+    return [fake_info(i) for i in range(count)]
+
+
+def queued_dicts(count):
+    songs = []
+    for i in range(count):
+        data = fake_info(i)
+        songs.append({
+            'url': data['webpage_url'], 'title': data['title'], 'thumbnail': data['thumbnail'],
+            'duration': format_duration(data['duration']), 'requester': '<@123456789012345678>',
+        })
+    return songs
+
+
+def queued_tracks(count):
+    queue = MusicQueue(1)
+    for i in range(count):
+        # Como las deja search_track: la URL de stream se queda en media_cache
+        track = ResolvedTrack.from_info(fake_info(i))
+        track.drop_stream()
+        queue.add_song(Song(track, '<@123456789012345678>'))
+    return queue
+
+
+def cached_streams(count):
+    # Acotada a STREAM_MAX_ENTRIES y compartida por todas las colas
+    cache = MediaCache(path=None)
+    for i in range(count):
+        track = ResolvedTrack.from_info(fake_info(i))
+        cache.streams.set(track.key, track.stream_state(), expires_at=track.expires_at)
+    return cache
+
+
+def playing_info(guilds):
+    queues = []
+    for i in range(guilds):
+        queue = MusicQueue(i)
+        # Lo que retenía el YTDLSource anterior en self.data
+        queue.current = fake_info(i)
+        queues.append(queue)
+    return queues
+
+
+def playing_tracks(guilds):
+    queues = []
+    for i in range(guilds):
+        queue = MusicQueue(i)
+        queue.mark_started(IdlePlayer(ResolvedTrack.from_info(fake_info(i)), opus=True))
+        queues.append(queue)
+    return queues
+
+
+def main():
+    print(f"{'caso':<44}{'tracemalloc (KB)':>18}{'RSS (KB)':>12}")
+    # Los casos grandes van al final: la memoria liberada no vuelve al sistema y falsearía el RSS
+    cases = [
+        ('1000 en cola: dict de canción (sin stream)', lambda: queued_dicts(1000)),
+        ('1000 en cola: Song + ResolvedTrack', lambda: queued_tracks(1000)),
+        ('1000 URLs de stream en MediaCache', lambda: cached_streams(1000)),
+        ('100 servidores sonando: reproductor + pista', lambda: playing_tracks(100)),
+        ('100 servidores sonando: info completo', lambda: playing_info(100)),
+        ('1000 en cola: info completo de yt-dlp', lambda: queued_info(1000)),
+    ]
+    for name, build in cases:
+        allocated, rss = measure(build)
+        rss_text = f'{rss / 1024:,.0f}' if rss is not None else '-'
+        print(f'{name:<44}{allocated / 1024:>18,.0f}{rss_text:>12}')
+
+
+if __name__ == '__main__':
+    main()
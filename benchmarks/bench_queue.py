@@ -0,0 +1,81 @@
+"""Micro-benchmark: IndexedQueue frente a la lista usada antes por MusicQueue
+
+Uso: python benchmarks/bench_queue.py [tamaños...]   (por defecto 10000 100000)
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexed_queue import IndexedQueue
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def bench_list(size, ops):
+    rng = random.Random(0)
+    songs = []
+    results = {'append': timed(lambda: [songs.append(i) for i in range(size)])}
+    positions = [(rng.randrange(size - 1), rng.randrange(size - 1)) for _ in range(ops)]
+
+    def move():
+        for source, destination in positions:
+            songs.insert(destination, songs.pop(source))
+
+    def remove_insert():
+        for source, destination in positions:
+            item = songs.pop(source)
+            songs.insert(destination, item)
+
+    results['move'] = timed(move)
+    results['remove+insert'] = timed(remove_insert)
+    # Mezclar una lista exige tenerla entera; es la referencia, no hay copia extra
+    results['shuffle'] = timed(lambda: rng.shuffle(songs))
+    results['page'] = timed(lambda: [songs[p:p + 10] for p in range(0, size, size // ops or 1)])
+    results['popleft'] = timed(lambda: [songs.pop(0) for _ in range(size)])
+    return results
+
+
+def bench_indexed(size, ops):
+    rng = random.Random(0)
+    songs = IndexedQueue()
+    results = {'append': timed(lambda: [songs.append(i) for i in range(size)])}
+    positions = [(rng.randrange(size - 1), rng.randrange(size - 1)) for _ in range(ops)]
+
+    def move():
+        for source, destination in positions:
+            songs.move(source, destination)
+
+    def remove_insert():
+        for source, destination in positions:
+            item = songs.pop(source)
+            songs.insert(destination, item)
+
+    results['move'] = timed(move)
+    results['remove+insert'] = timed(remove_insert)
+    results['shuffle'] = timed(lambda: songs.shuffle(rng))
+    results['page'] = timed(lambda: [songs.page(p, 10) for p in range(0, size, size // ops or 1)])
+    results['popleft'] = timed(lambda: [songs.popleft() for _ in range(size)])
+    return results
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    ops = 2_000
+    for size in sizes:
+        print(f'\n{size:,} canciones ({ops:,} operaciones por posición)')
+        print(f"{'operación':<16}{'list (ms)':>12}{'IndexedQueue (ms)':>20}")
+        baseline = bench_list(size, ops)
+        indexed = bench_indexed(size, ops)
+        for name in baseline:
+            print(f'{name:<16}{baseline[name] * 1000:>12.1f}{indexed[name] * 1000:>20.1f}')
+
+
+if __name__ == '__main__':
+    main()
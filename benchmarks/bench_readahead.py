@@ -0,0 +1,89 @@
+"""Cortes audibles con y sin lectura adelantada ante una red con parones
+
+Uso: python benchmarks/bench_readahead.py [segundos de audio]
+
+Simula un FFmpeg que lee de la red más rápido que tiempo real pero con parones
+aleatorios (misma semilla en todos los casos) y un consumidor que, como el hilo
+de audio de discord.py, pide un frame cada 20 ms. Cuenta los frames entregados
+tarde (cortes audibles) y el tiempo total de retraso acumulado.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+
+from readahead import FRAME_SECONDS, ReadAheadSource
+
+# FFmpeg decodifica y descarga a ~4x tiempo real cuando la red responde
+SOURCE_SPEED = 4.0
+STALL_EVERY = (1.5, 4.0)
+STALL_LENGTH = (0.1, 1.0)
+
+
+class StallingSource(discord.AudioSource):
+    """Paquetes Opus sintéticos con parones de red intercalados"""
+
+    def __init__(self, frames, seed=0):
+        rng = random.Random(seed)
+        self.frames = frames
+        self.sent = 0
+        self.stalls = {}
+        at = 0.0
+        while at < frames * FRAME_SECONDS:
+            at += rng.uniform(*STALL_EVERY)
+            self.stalls[int(at / FRAME_SECONDS)] = rng.uniform(*STALL_LENGTH)
+
+    def read(self):
+        if self.sent >= self.frames:
+            return b''
+        time.sleep(self.stalls.get(self.sent, 0.0) + FRAME_SECONDS / SOURCE_SPEED)
+        self.sent += 1
+        return b'\xfc' * 320
+
+    def is_opus(self):
+        return True
+
+
+def play(source):
+    """Consume a 50 frames/s como AudioPlayer; devuelve (frames tarde, segundos de retraso)"""
+    late = 0
+    delay = 0.0
+    start = time.perf_counter()
+    loops = 0
+    while source.read():
+        loops += 1
+        due = start + loops * FRAME_SECONDS
+        behind = time.perf_counter() - due
+        if behind > FRAME_SECONDS:
+            late += 1
+            delay += behind
+            # AudioPlayer no recupera el tiempo perdido: reprograma desde ahora
+            start += behind
+            continue
+        time.sleep(max(0.0, due - time.perf_counter()))
+    source.cleanup()
+    return late, delay
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 20.0
+    frames = int(seconds / FRAME_SECONDS)
+    print(f"{'modo':<22}{'frames tarde':>14}{'retraso total':>16}{'underruns':>11}{'memoria':>10}")
+    for label, readahead in (('directo', 0), ('read-ahead 0,5 s', 0.5), ('read-ahead 2 s', 2.0)):
+        source = StallingSource(frames)
+        underruns, memory = '-', '-'
+        if readahead:
+            source = ReadAheadSource(source, readahead)
+            memory = f'{source.capacity * source.slot_size // 1024} KB'
+        late, delay = play(source)
+        if readahead:
+            underruns = source.underruns
+        print(f'{label:<22}{late:>14}{delay:>15.2f}s{underruns:>11}{memory:>10}')
+
+
+if __name__ == '__main__':
+    main()
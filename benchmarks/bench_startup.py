@@ -0,0 +1,105 @@
+"""Tiempo de arranque: importación del bot, búsqueda de FFmpeg y, con token, hasta on_ready
+
+Uso: python benchmarks/bench_startup.py [--runs N] [--module main_fixed] [--gateway]
+
+- Importación: lanza N procesos que solo importan el módulo del bot (sin conectar)
+  y mide el tiempo de pared desde el lanzamiento.
+- FFmpeg: recorre un store de Nix sintético (STORE_ENTRIES paquetes) sin archivo de
+  estado y con él, como en un reinicio de Replit.
+- --gateway: arranca el bot de verdad (necesita DISCORD_TOKEN) y lee el
+  "Arranque completo" que registra en su primer on_ready.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ffmpeg_locator
+
+STORE_ENTRIES = 5000
+
+
+def bench_import(module, runs):
+    env = {**os.environ, 'PYTHONPATH': ROOT, 'LOG_LEVEL': 'ERROR'}
+    env.pop('DISCORD_TOKEN', None)
+    times = []
+    with tempfile.TemporaryDirectory() as cwd:
+        for _ in range(runs):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, '-c', f'import {module}'], cwd=cwd, env=env, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append(time.perf_counter() - started)
+    print(f'importar {module}: mediana {statistics.median(times) * 1000:.0f} ms, '
+          f'mín {min(times) * 1000:.0f} ms ({runs} procesos)')
+
+
+def bench_ffmpeg(runs):
+    with tempfile.TemporaryDirectory() as store:
+        for i in range(STORE_ENTRIES):
+            os.makedirs(os.path.join(store, f'{i:05d}-pkg', 'bin'))
+        binary = os.path.join(store, f'{STORE_ENTRIES - 1:05d}-pkg', 'bin', 'ffmpeg')
+        with open(binary, 'w') as f:
+            f.write('#!/bin/sh\n')
+        os.chmod(binary, 0o755)
+        state_file = os.path.join(store, 'state.json')
+
+        saved = (ffmpeg_locator.NIX_PATTERN, ffmpeg_locator.COMMON_PATHS, os.environ.get('PATH', ''))
+        ffmpeg_locator.NIX_PATTERN = os.path.join(store, '*', 'bin', 'ffmpeg')
+        ffmpeg_locator.COMMON_PATHS = ()
+        os.environ['PATH'] = ''
+        try:
+            for label, keep_state in (('sin estado (escaneo)', False), ('con estado', True)):
+                times = []
+                for _ in range(runs):
+                    if not keep_state and os.path.exists(state_file):
+                        os.remove(state_file)
+                    started = time.perf_counter()
+                    assert ffmpeg_locator.find_ffmpeg(state_file) == binary
+                    times.append(time.perf_counter() - started)
+                print(f'buscar FFmpeg {label}: mediana {statistics.median(times) * 1000:.2f} ms')
+        finally:
+            ffmpeg_locator.NIX_PATTERN, ffmpeg_locator.COMMON_PATHS, os.environ['PATH'] = saved
+
+
+def bench_gateway(module):
+    if not os.environ.get('DISCORD_TOKEN'):
+        print('--gateway necesita DISCORD_TOKEN')
+        return
+    env = {**os.environ, 'PYTHONPATH': ROOT, 'LOG_FORMAT': 'json', 'LOG_LEVEL': 'INFO', 'PORT': '0'}
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, f'{module}.py')], cwd=ROOT, env=env,
+                               stderr=subprocess.PIPE, text=True)
+    try:
+        for line in process.stderr:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if 'startup_seconds' in record:
+                print(f'lanzamiento → on_ready: {record["startup_seconds"] * 1000:.0f} ms')
+                break
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--module', default='main_fixed')
+    parser.add_argument('--gateway', action='store_true')
+    args = parser.parse_args()
+    bench_import(args.module, args.runs)
+    bench_ffmpeg(args.runs)
+    if args.gateway:
+        bench_gateway(args.module)
+
+
+if __name__ == '__main__':
+    main()
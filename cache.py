@@ -0,0 +1,240 @@
+"""Caché en dos niveles (memoria LRU + SQLite) para búsquedas, metadatos y URLs de stream"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+SEARCH_TTL = 24 * 3600
+METADATA_TTL = 7 * 24 * 3600
+MEMORY_MAX_ENTRIES = 2048
+DISK_MAX_ENTRIES = 50000
+STREAM_MAX_ENTRIES = 1024
+# Las URLs de stream se descartan este tiempo antes de su caducidad real
+STREAM_EXPIRY_MARGIN = 120
+
+
+def normalize_query(query):
+    """Normaliza una búsqueda para que variantes triviales compartan entrada"""
+    return ' '.join(query.lower().split())
+
+
+class LRUCache:
+    """Caché en memoria con expiración por entrada y desalojo LRU"""
+
+    def __init__(self, max_entries, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        if expires_at is None:
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self):
+        return {'entries': len(self._data), 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+
+class SQLiteStore:
+    """Segundo nivel persistente: una tabla por espacio de nombres, valores JSON
+
+    Las filas de cada tabla se cuentan en memoria, así que insertar no recorre la
+    tabla: solo se poda cuando el contador pasa del límite. Es síncrona; TieredCache
+    la llama desde un hilo para no bloquear el event loop.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        # Filas por tabla
+        self._counts = {}
+
+    def _table(self, namespace):
+        table = f'cache_{namespace}'
+        if table not in self._counts:
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            self._conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_accessed ON {table}(accessed_at)')
+            self._counts[table] = self._conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        return table
+
+    def get(self, namespace, key):
+        now = time.time()
+        with self._lock:
+            table = self._table(namespace)
+            row = self._conn.execute(
+                f'SELECT value, expires_at FROM {table} WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._counts[table] -= self._conn.execute(f'DELETE FROM {table} WHERE key = ?', (key,)).rowcount
+                return None
+            self._conn.execute(f'UPDATE {table} SET accessed_at = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+
+    def set(self, namespace, key, value, ttl, max_entries):
+        now = time.time()
+        with self._lock:
+            table = self._table(namespace)
+            row = (json.dumps(value), now + ttl, now, key)
+            # UPDATE primero: solo una clave nueva añade una fila al contador
+            updated = self._conn.execute(
+                f'UPDATE {table} SET value = ?, expires_at = ?, accessed_at = ? WHERE key = ?', row
+            ).rowcount
+            if not updated:
+                self._conn.execute(
+                    f'INSERT INTO {table} (value, expires_at, accessed_at, key) VALUES (?, ?, ?, ?)', row
+                )
+                self._counts[table] += 1
+            if self._counts[table] > max_entries:
+                self._prune(table, now, max_entries)
+
+    def _prune(self, table, now, max_entries):
+        # Desalojar primero lo caducado y después lo menos usado
+        count = self._counts[table]
+        count -= self._conn.execute(f'DELETE FROM {table} WHERE expires_at <= ?', (now,)).rowcount
+        if count > max_entries:
+            count -= self._conn.execute(
+                f'DELETE FROM {table} WHERE rowid IN ('
+                f'SELECT rowid FROM {table} ORDER BY accessed_at LIMIT ?)',
+                (count - max_entries,),
+            ).rowcount
+        self._counts[table] = count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """Memoria LRU delante de un espacio de nombres de SQLite"""
+
+    def __init__(self, namespace, store, *, ttl, memory_entries, disk_entries):
+        self.namespace = namespace
+        self.store = store
+        self.ttl = ttl
+        self.disk_entries = disk_entries
+        self.memory = LRUCache(memory_entries, ttl)
+        self.disk_hits = 0
+        self.disk_misses = 0
+
+    async def get(self, key):
+        value = self.memory.get(key)
+        if value is not None or self.store is None:
+            return value
+        try:
+            value = await asyncio.to_thread(self.store.get, self.namespace, key)
+        except sqlite3.Error as e:
+            log.warning('Error leyendo la caché %s: %s', self.namespace, e)
+            value = None
+        if value is None:
+            self.disk_misses += 1
+            return None
+        self.disk_hits += 1
+        self.memory.set(key, value)
+        return value
+
+    async def set(self, key, value):
+        self.memory.set(key, value)
+        if self.store is None:
+            return
+        try:
+            await asyncio.to_thread(self.store.set, self.namespace, key, value, self.ttl, self.disk_entries)
+        except sqlite3.Error as e:
+            log.warning('Error escribiendo la caché %s: %s', self.namespace, e)
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats.update(disk_hits=self.disk_hits, disk_misses=self.disk_misses)
+        return stats
+
+
+class MediaCache:
+    """Búsqueda→pista y pista→metadatos en dos niveles; URLs de stream solo en memoria"""
+
+    def __init__(self, path='cache.sqlite3', *, search_ttl=SEARCH_TTL,
+                 metadata_ttl=METADATA_TTL, memory_entries=MEMORY_MAX_ENTRIES,
+                 disk_entries=DISK_MAX_ENTRIES, stream_entries=STREAM_MAX_ENTRIES):
+        store = None
+        if path:
+            try:
+                store = SQLiteStore(path)
+            except sqlite3.Error as e:
+                log.warning('Caché en disco desactivada (%s): %s', path, e)
+        self.store = store
+        self.search = TieredCache('search', store, ttl=search_ttl,
+                                  memory_entries=memory_entries, disk_entries=disk_entries)
+        self.metadata = TieredCache('metadata', store, ttl=metadata_ttl,
+                                    memory_entries=memory_entries, disk_entries=disk_entries)
+        # Las URLs de stream caducan en horas: no merece la pena persistirlas
+        self.streams = LRUCache(stream_entries)
+
+    async def get_search(self, query):
+        """Devuelve los metadatos de la pista para una búsqueda ya vista"""
+        key = await self.search.get(normalize_query(query))
+        if key is None:
+            return None
+        return await self.metadata.get(key)
+
+    async def set_search(self, query, track):
+        await self.search.set(normalize_query(query), track.key)
+        await self.set_track(track)
+
+    async def set_track(self, track):
+        """Guarda metadatos y, si es válida, la URL de stream de una pista"""
+        if track.stream_url and track.expires_at is not None:
+            self.streams.set(track.key, track.stream_state(),
+                             expires_at=track.expires_at - STREAM_EXPIRY_MARGIN)
+        await self.metadata.set(track.key, track.to_metadata())
+
+    def get_stream(self, key):
+        return self.streams.get(key)
+
+    def stats(self):
+        return {'search': self.search.stats(), 'metadata': self.metadata.stats(),
+                'streams': self.streams.stats()}
@@ -0,0 +1,469 @@
+"""Extracción con yt-dlp: pool dedicado de workers y deduplicación de peticiones idénticas"""
+import asyncio
+import copy
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs, urlencode
+
+from cache import normalize_query
+from metrics import Histogram
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_PENDING = 64
+DEFAULT_SEARCH_TIMEOUT = 15
+DEFAULT_RESOLVE_TIMEOUT = 20
+DEFAULT_RETRIES = 1
+# Espera base entre reintentos; se duplica en cada intento y lleva jitter
+RETRY_BACKOFF = 0.5
+# Errores de yt-dlp que no se arreglan reintentando
+_PERMANENT_ERRORS = ('Video unavailable', 'Private video', 'Sign in', 'Unsupported URL',
+                     'is not available', 'has been removed', 'copyright')
+
+_YOUTUBE_HOSTS = {'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com'}
+# Parámetros que no cambian el contenido y solo romperían la deduplicación
+_IGNORED_PARAMS = {'si', 'feature', 'pp', 'ab_channel'}
+# Opciones de yt-dlp para expandir una lista sin resolver cada vídeo
+FLAT_PLAYLIST_PARAMS = {'extract_flat': 'in_playlist', 'noplaylist': False}
+# Extractores que usa el bot: vídeos, búsquedas (ytsearch:) y listas
+WARM_EXTRACTORS = ('Youtube', 'YoutubeSearch', 'YoutubeTab')
+DEFAULT_WARM_TIMEOUT = 60
+
+
+def search_key(query):
+    """Clave de deduplicación para una búsqueda"""
+    return 'ytsearch:' + normalize_query(query)
+
+
+def url_key(url):
+    """Clave de deduplicación para una URL, tolerante a variantes del mismo vídeo"""
+    url = url.strip()
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    if host in _YOUTUBE_HOSTS:
+        video = parse_qs(parsed.query).get('v')
+        if video and parsed.path == '/watch':
+            return 'youtube:' + video[0]
+        if parsed.path.startswith('/shorts/'):
+            return 'youtube:' + parsed.path.split('/')[2]
+    if host == 'youtu.be' and parsed.path.strip('/'):
+        return 'youtube:' + parsed.path.strip('/')
+    if not parsed.scheme:
+        return 'ytsearch:' + normalize_query(url)
+    params = sorted(
+        (k, v) for k, values in parse_qs(parsed.query).items()
+        if k not in _IGNORED_PARAMS and not k.startswith('utm_')
+        for v in values
+    )
+    return f"{host}{parsed.path.rstrip('/')}?{urlencode(params)}"
+
+
+def is_playlist_url(url):
+    """Indica si la URL es una lista de reproducción de YouTube"""
+    parsed = urlparse(url.strip())
+    return (parsed.netloc.lower() in _YOUTUBE_HOSTS and parsed.path == '/playlist'
+            and 'list' in parse_qs(parsed.query))
+
+
+def _extract_with(ytdl, url, download, params):
+    """extract_info con opciones propias de esta petición sobre la instancia del worker"""
+    if not params:
+        return ytdl.extract_info(url, download=download)
+    saved = {key: ytdl.params.get(key) for key in params}
+    ytdl.params.update(params)
+    try:
+        return ytdl.extract_info(url, download=download)
+    finally:
+        ytdl.params.update(saved)
+
+
+def _stand_in_info():
+    """Resultado sintético de extract_info para recorrer el procesado de yt-dlp sin red"""
+    video_id = 'warmup00000'
+    return {
+        'id': video_id, 'title': 'warm-up', 'extractor': 'youtube', 'extractor_key': 'Youtube',
+        'webpage_url': f'https://www.youtube.com/watch?v={video_id}', 'duration': 1,
+        'formats': [
+            {'format_id': '251', 'url': 'https://localhost.invalid/251', 'ext': 'webm', 'acodec': 'opus',
+             'vcodec': 'none', 'abr': 130, 'asr': 48000, 'protocol': 'https'},
+            {'format_id': '140', 'url': 'https://localhost.invalid/140', 'ext': 'm4a', 'acodec': 'mp4a.40.2',
+             'vcodec': 'none', 'abr': 128, 'asr': 44100, 'protocol': 'https'},
+        ],
+    }
+
+
+def _warm_up(ytdl):
+    """Hace sin red lo que yt-dlp deja para la primera extracción
+
+    Importa e inicializa los extractores de YouTube (con sus player_client) y pasa
+    un resultado sintético por la selección de formato y el saneado.
+    """
+    for key in WARM_EXTRACTORS:
+        ytdl.get_info_extractor(key).initialize()
+    ytdl.process_ie_result(_stand_in_info(), download=False)
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una única ejecución"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.started = 0
+        self.shared = 0
+
+    def __len__(self):
+        return len(self._inflight)
+
+    async def do(self, key, factory):
+        """Ejecuta `factory()` una sola vez por clave; el resto de llamadas esperan su resultado"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+            self.started += 1
+        else:
+            self.shared += 1
+        # shield: si un llamante se cancela, los demás siguen esperando el mismo resultado
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            # Evita el aviso de "excepción nunca recuperada" si todos los llamantes se cancelaron
+            future.exception()
+
+
+class ExtractionError(Exception):
+    """Fallo de yt-dlp dentro de un worker de proceso"""
+
+
+class ExtractionTimeout(ExtractionError):
+    """La extracción superó su plazo y el worker fue liberado"""
+
+
+def _is_retryable(error):
+    if isinstance(error, ExtractionTimeout):
+        return True
+    message = str(error)
+    return not any(marker in message for marker in _PERMANENT_ERRORS)
+
+
+class _ThreadWorker:
+    """Worker con un hilo propio y su propia instancia de YoutubeDL"""
+
+    def __init__(self, options):
+        self._options = options
+        # Un YoutubeDL por hilo: tras un abort() el hilo nuevo no comparte instancia con el colgado
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ytdl-worker')
+
+    async def start(self):
+        pass
+
+    def _ytdl(self):
+        ytdl = getattr(self._local, 'ytdl', None)
+        if ytdl is None:
+            import yt_dlp
+            # YoutubeDL se queda con el diccionario y lo modifica: cada instancia recibe su copia
+            ytdl = self._local.ytdl = yt_dlp.YoutubeDL(copy.deepcopy(self._options))
+        return ytdl
+
+    def _extract(self, url, download, params):
+        return _extract_with(self._ytdl(), url, download, params)
+
+    async def run(self, url, download, params=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._extract, url, download, params)
+
+    async def warm(self):
+        # En el hilo del worker, que es quien guarda su YoutubeDL
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, lambda: _warm_up(self._ytdl()))
+
+    def abort(self):
+        """Un hilo no se puede matar: se abandona y el worker sigue con uno nuevo"""
+        old = self._executor
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ytdl-worker')
+        old.shutdown(wait=False)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class _ProcessWorker:
+    """Worker en un proceso hijo (sin GIL compartido) que habla JSON por stdin/stdout"""
+
+    def __init__(self, options):
+        self._options = options
+        self._process = None
+        # Hilo propio para esperar la respuesta del hijo sin bloquear el event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ytdl-proc')
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._spawn)
+
+    def _spawn(self):
+        # Serializar antes de lanzar: un hijo sin su línea de opciones se quedaría esperando
+        options = json.dumps(self._options)
+        self._process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1,
+        )
+        self._process.stdin.write(options + '\n')
+
+    def _request(self, request):
+        if self._process is None or self._process.poll() is not None:
+            self._spawn()
+        process = self._process
+        process.stdin.write(json.dumps(request) + '\n')
+        line = process.stdout.readline()
+        if not line:
+            raise ExtractionError('El proceso de extracción terminó inesperadamente')
+        reply = json.loads(line)
+        if not reply['ok']:
+            raise ExtractionError(reply['error'])
+        return reply.get('info')
+
+    def _extract(self, url, download, params):
+        return self._request({'url': url, 'download': download, 'params': params})
+
+    async def run(self, url, download, params=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._extract, url, download, params)
+
+    async def warm(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._request, {'warm': True})
+
+    def abort(self):
+        """Mata el proceso colgado; la siguiente petición arranca uno nuevo"""
+        process, self._process = self._process, None
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def close(self):
+        self.abort()
+        self._executor.shutdown(wait=False)
+
+
+class ExtractionEngine:
+    """Pool acotado de workers de yt-dlp con cola limitada y deduplicación de peticiones
+
+    Cada worker tiene su propia instancia de YoutubeDL (hilo dedicado o proceso hijo
+    con `mode='process'`). Cuando la cola está llena, `extract` espera a que haya
+    hueco en lugar de acumular trabajo sin límite. Cada intento tiene un plazo: si se
+    agota, el llamante recibe ExtractionTimeout y el worker se libera (en modo
+    proceso, matando al hijo).
+    """
+
+    def __init__(self, options, *, workers=DEFAULT_WORKERS, mode='thread',
+                 max_pending=DEFAULT_MAX_PENDING, search_timeout=DEFAULT_SEARCH_TIMEOUT,
+                 resolve_timeout=DEFAULT_RESOLVE_TIMEOUT, retries=DEFAULT_RETRIES):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f'Modo de extracción desconocido: {mode}')
+        # Copia propia: un YoutubeDL creado con el mismo diccionario lo llenaría de sets y objetos
+        # que ya no se pueden pasar en JSON a los workers de proceso
+        self.options = copy.deepcopy(options)
+        self.mode = mode
+        self.size = max(1, workers)
+        self.max_pending = max_pending
+        self.search_timeout = search_timeout
+        self.resolve_timeout = resolve_timeout
+        self.retries = retries
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.retried = 0
+        self.aborted = 0
+        # Precalentamiento: /ready espera a que termine
+        self.warmed = False
+        self.warm_seconds = None
+        # Latencia de extremo a extremo (cola, reintentos y extracción) por tipo de petición
+        self.latency = {}
+        self._inflight = SingleFlight()
+        self._queue = None
+        self._workers = []
+        self._tasks = []
+
+    @property
+    def queue_depth(self):
+        """Peticiones esperando un worker libre"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_started(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        worker_cls = _ProcessWorker if self.mode == 'process' else _ThreadWorker
+        for _ in range(self.size):
+            worker = worker_cls(self.options)
+            self._workers.append(worker)
+            self._tasks.append(asyncio.ensure_future(self._serve(worker)))
+
+    async def _serve(self, worker):
+        await worker.start()
+        loop = asyncio.get_running_loop()
+        while True:
+            url, download, params, deadline, future = await self._queue.get()
+            if future.done():
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                # Caducó esperando en la cola: ni siquiera se ocupa el worker
+                future.set_exception(ExtractionTimeout(f'Plazo agotado en cola: {url}'))
+                continue
+            self.busy += 1
+            try:
+                result = await asyncio.wait_for(worker.run(url, download, params), remaining)
+            except asyncio.TimeoutError:
+                self.aborted += 1
+                worker.abort()
+                if not future.done():
+                    future.set_exception(ExtractionTimeout(f'Plazo agotado extrayendo: {url}'))
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self.busy -= 1
+
+    async def _submit_once(self, url, download, params, timeout):
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        future = loop.create_future()
+        try:
+            # Contrapresión: si la cola está llena, se espera aquí (dentro del plazo)
+            await asyncio.wait_for(self._queue.put((url, download, params, deadline, future)), timeout)
+        except asyncio.TimeoutError:
+            raise ExtractionTimeout(f'Cola de extracción llena: {url}') from None
+        return await future
+
+    async def _submit(self, url, download, params, timeout, kind):
+        started = time.perf_counter()
+        try:
+            return await self._submit_with_retries(url, download, params, timeout)
+        finally:
+            histogram = self.latency.get(kind)
+            if histogram is None:
+                histogram = self.latency[kind] = Histogram()
+            histogram.observe(time.perf_counter() - started)
+
+    async def _submit_with_retries(self, url, download, params, timeout):
+        attempt = 0
+        while True:
+            try:
+                result = await self._submit_once(url, download, params, timeout)
+            except Exception as e:
+                if isinstance(e, ExtractionTimeout):
+                    self.timeouts += 1
+                if attempt >= self.retries or not _is_retryable(e):
+                    self.failed += 1
+                    raise
+                # Backoff exponencial con jitter para no reintentar todos a la vez
+                delay = RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+                log.info('Reintentando extracción de %s en %.2fs: %s', url, delay, e)
+                attempt += 1
+                self.retried += 1
+                await asyncio.sleep(delay)
+            else:
+                self.completed += 1
+                return result
+
+    async def extract(self, url, *, download=False, key=None, timeout=None, params=None, kind='resolve'):
+        """Extrae `url` en el pool; peticiones simultáneas con la misma clave comparten resultado
+
+        `params` son opciones de yt-dlp solo para esta petición (p. ej. extracción plana).
+        """
+        key = key or url_key(url)
+        timeout = timeout or self.resolve_timeout
+        flight = (key, download, tuple(sorted(params.items())) if params else None)
+        return await self._inflight.do(flight, lambda: self._submit(url, download, params, timeout, kind))
+
+    async def extract_playlist(self, url, *, start=1, end=None):
+        """Expande las entradas `start`..`end` de una lista sin resolver cada vídeo
+
+        yt-dlp deja de paginar al llegar a `end`, así que el primer lote cuesta una
+        sola petición aunque la lista sea larga.
+        """
+        items = f"{start}-{end if end is not None else ''}"
+        return await self.extract(url, params={**FLAT_PLAYLIST_PARAMS, 'playlist_items': items}, kind='playlist')
+
+    async def search(self, query):
+        """Busca en YouTube y devuelve el diccionario de yt-dlp"""
+        return await self.extract(f"ytsearch:{query}", key=search_key(query), timeout=self.search_timeout,
+                                  kind='search')
+
+    async def warm(self, timeout=DEFAULT_WARM_TIMEOUT):
+        """Arranca los workers y precalienta cada uno sin red; termina aunque alguno falle"""
+        self._ensure_started()
+        started = time.perf_counter()
+        results = await asyncio.gather(*(asyncio.wait_for(worker.warm(), timeout) for worker in self._workers),
+                                       return_exceptions=True)
+        failures = [result for result in results if isinstance(result, BaseException)]
+        for error in failures:
+            log.warning('Falló el precalentamiento de un worker de extracción: %r', error)
+        self.warm_seconds = time.perf_counter() - started
+        self.warmed = True
+        log.info('Workers de extracción precalentados en %.2f s', self.warm_seconds,
+                 extra={'workers': len(self._workers), 'failed': len(failures)})
+
+    def stats(self):
+        return {
+            'mode': self.mode, 'warmed': self.warmed, 'warm_seconds': self.warm_seconds, 'workers': self.size, 'busy': self.busy,
+            'queue_depth': self.queue_depth, 'max_pending': self.max_pending,
+            'inflight': len(self._inflight), 'shared': self._inflight.shared,
+            'completed': self.completed, 'failed': self.failed, 'timeouts': self.timeouts,
+            'retried': self.retried, 'aborted': self.aborted,
+        }
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        for worker in self._workers:
+            worker.close()
+        self._tasks.clear()
+        self._workers.clear()
+        self._queue = None
+
+
+def _worker_main():
+    """Bucle del proceso hijo: lee peticiones JSON por stdin y responde por stdout"""
+    import yt_dlp
+
+    # stdout queda reservado al protocolo; cualquier salida de yt-dlp va a stderr
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), 'w', buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    options = json.loads(sys.stdin.readline())
+    ytdl = yt_dlp.YoutubeDL(options)
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            if request.get('warm'):
+                _warm_up(ytdl)
+                reply = {'ok': True}
+            else:
+                info = _extract_with(ytdl, request['url'], request['download'], request.get('params'))
+                reply = {'ok': True, 'info': ytdl.sanitize_info(info)}
+        except Exception as e:
+            reply = {'ok': False, 'error': str(e)}
+        protocol.write(json.dumps(reply) + '\n')
+
+
+if __name__ == '__main__':
+    _worker_main()
@@ -0,0 +1,68 @@
+"""Búsqueda del ejecutable de FFmpeg, con la ruta guardada en un archivo de estado entre reinicios"""
+import glob
+import json
+import logging
+import os
+import shutil
+
+log = logging.getLogger(__name__)
+
+STATE_FILE = '.ffmpeg_path.json'
+COMMON_PATHS = ('/usr/bin/ffmpeg', '/usr/local/bin/ffmpeg')
+# Replit instala FFmpeg con Nix: recorrer el store entero es lo caro del arranque
+NIX_PATTERN = '/nix/store/*/bin/ffmpeg'
+
+
+def _is_executable(path):
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def _signature(path):
+    """Tamaño y fecha del binario: si cambian (actualización del store) la ruta guardada no vale"""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _load(state_file):
+    try:
+        with open(state_file, encoding='utf-8') as f:
+            state = json.load(f)
+        path = state['path']
+        if _is_executable(path) and _signature(path) == state['signature']:
+            return path
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def _save(state_file, path):
+    tmp = f'{state_file}.tmp'
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'path': path, 'signature': _signature(path)}, f)
+        os.replace(tmp, state_file)
+    except OSError as e:
+        log.warning('No se pudo guardar la ruta de FFmpeg en %s: %s', state_file, e)
+
+
+def find_ffmpeg(state_file=STATE_FILE):
+    """Ruta de FFmpeg o None
+
+    Orden: PATH, la ruta de `state_file` si el binario sigue ahí sin cambios, rutas
+    habituales y, solo si nada de eso sirve, el store de Nix. Lo encontrado fuera
+    del PATH se guarda en `state_file` para el siguiente arranque.
+    """
+    path = shutil.which('ffmpeg')
+    if path:
+        return path
+    if state_file:
+        path = _load(state_file)
+        if path:
+            return path
+    path = next((p for p in COMMON_PATHS if _is_executable(p)), None)
+    if path is None:
+        log.info('Buscando FFmpeg en el store de Nix')
+        path = next((p for p in sorted(glob.glob(NIX_PATTERN)) if _is_executable(p)), None)
+    if path and state_file:
+        _save(state_file, path)
+    return path
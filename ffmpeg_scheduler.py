@@ -0,0 +1,207 @@
+"""Planificador global de procesos FFmpeg: límite de concurrencia, reparto justo por servidor y consumo"""
+import asyncio
+import logging
+import os
+import subprocess
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_PROCESSES = 32
+
+try:
+    _CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _CLOCK_TICKS = _PAGE_SIZE = None
+
+
+def process_usage(pid):
+    """Devuelve (segundos de CPU, RSS en bytes) de un proceso leyendo /proc, o None"""
+    if _CLOCK_TICKS is None:
+        return None
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # El nombre del comando va entre paréntesis y puede contener espacios
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/statm') as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    # utime y stime son los campos 14 y 15 de /proc/<pid>/stat
+    cpu = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    return cpu, rss_pages * _PAGE_SIZE
+
+
+class FFmpegSlot:
+    """Permiso para mantener vivo el FFmpeg de una pista; se libera al terminarla"""
+
+    def __init__(self, scheduler, guild_id):
+        self.scheduler = scheduler
+        self.guild_id = guild_id
+        self.acquired_at = time.monotonic()
+        self.sources = []
+        self.released = False
+
+    def attach(self, source):
+        """Asocia un AudioSource de FFmpeg (los reinicios añaden uno nuevo)"""
+        self.sources.append(source)
+        if len(self.sources) > 2:
+            del self.sources[0]
+
+    def pids(self):
+        pids = []
+        for source in self.sources:
+            process = getattr(source, '_process', None)
+            if process is not None and process.poll() is None:
+                pids.append(process.pid)
+        return pids
+
+    def release(self):
+        """Libera el hueco; se puede llamar desde el hilo de audio de discord.py"""
+        if self.released:
+            return
+        self.released = True
+        self.sources.clear()
+        self.scheduler._release_threadsafe(self)
+
+
+class FFmpegScheduler:
+    """Controla cuántos FFmpeg pueden decodificar a la vez en todo el bot
+
+    Cuando se alcanza el límite, las peticiones esperan en una cola por servidor y
+    los huecos libres se reparten por turnos entre servidores, de modo que un
+    servidor con mucha actividad no acapare los procesos.
+    """
+
+    def __init__(self, max_processes=DEFAULT_MAX_PROCESSES, *, executable='ffmpeg'):
+        self.max_processes = max(1, max_processes)
+        self.executable = executable
+        self.spawned = 0
+        self.waited = 0
+        self._active = set()
+        self._waiters = {}
+        self._turns = deque()
+        self._loop = None
+        self.warm_spawn_ms = None
+
+    @property
+    def active(self):
+        return len(self._active)
+
+    @property
+    def waiting(self):
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    async def acquire(self, guild_id):
+        """Espera un hueco libre para arrancar un FFmpeg del servidor `guild_id`"""
+        self._loop = asyncio.get_running_loop()
+        if len(self._active) < self.max_processes and not self._turns:
+            return self._grant(guild_id)
+
+        self.waited += 1
+        future = self._loop.create_future()
+        waiters = self._waiters.get(guild_id)
+        if waiters is None:
+            waiters = self._waiters[guild_id] = deque()
+            self._turns.append(guild_id)
+        waiters.append(future)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Se concedió justo cuando el llamante se canceló
+                future.result().release()
+            else:
+                self._discard_waiter(guild_id, future)
+            raise
+
+    def _grant(self, guild_id):
+        slot = FFmpegSlot(self, guild_id)
+        self._active.add(slot)
+        self.spawned += 1
+        return slot
+
+    def _discard_waiter(self, guild_id, future):
+        waiters = self._waiters.get(guild_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(future)
+        except ValueError:
+            pass
+        if not waiters:
+            del self._waiters[guild_id]
+            self._turns.remove(guild_id)
+
+    def _release_threadsafe(self, slot):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            self._release(slot)
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._release(slot)
+        else:
+            loop.call_soon_threadsafe(self._release, slot)
+
+    def _release(self, slot):
+        self._active.discard(slot)
+        # Turno rotatorio: el primer servidor en espera recibe el hueco y pasa al final
+        while self._turns and len(self._active) < self.max_processes:
+            guild_id = self._turns.popleft()
+            waiters = self._waiters[guild_id]
+            future = waiters.popleft()
+            if waiters:
+                self._turns.append(guild_id)
+            else:
+                del self._waiters[guild_id]
+            if not future.done():
+                future.set_result(self._grant(guild_id))
+
+    def processes(self):
+        """Consumo de CPU y memoria de cada FFmpeg vivo, por servidor"""
+        usage = []
+        for slot in list(self._active):
+            for pid in slot.pids():
+                stats = process_usage(pid)
+                if stats is None:
+                    continue
+                cpu, rss = stats
+                usage.append({'guild_id': slot.guild_id, 'pid': pid,
+                              'cpu_seconds': cpu, 'rss_bytes': rss})
+        return usage
+
+    def stats(self):
+        processes = self.processes()
+        return {
+            'active': self.active, 'waiting': self.waiting, 'max': self.max_processes,
+            'spawned': self.spawned, 'waited': self.waited,
+            'cpu_seconds': sum(p['cpu_seconds'] for p in processes),
+            'rss_bytes': sum(p['rss_bytes'] for p in processes),
+            'warm_spawn_ms': self.warm_spawn_ms,
+        }
+
+    async def warm(self, spares=1):
+        """Precalienta FFmpeg (binario y bibliotecas en la caché de páginas del sistema)
+
+        discord.py arranca FFmpeg con la URL de entrada en la línea de comandos, así que
+        no se puede tener un proceso creado de antemano a la espera de su entrada; lo que
+        sí se evita es que el primer arranque tras un reinicio pague la carga en frío.
+        """
+        loop = asyncio.get_running_loop()
+        for _ in range(max(0, spares)):
+            started = time.perf_counter()
+            try:
+                await loop.run_in_executor(None, lambda: subprocess.run(
+                    [self.executable, '-hide_banner', '-version'],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False,
+                ))
+            except OSError as e:
+                log.warning('No se pudo precalentar FFmpeg: %s', e)
+                return
+            self.warm_spawn_ms = (time.perf_counter() - started) * 1000
@@ -0,0 +1,146 @@
+"""Servidor HTTP de salud y métricas sobre el event loop del bot (sustituye al keep-alive de Flask)"""
+import asyncio
+import logging
+import math
+import time
+
+from aiohttp import web
+
+from metrics import Histogram, MetricsWriter
+
+log = logging.getLogger(__name__)
+
+# Retraso del event loop a partir del cual el proceso deja de considerarse vivo
+MAX_LOOP_LAG = 2.0
+# Tiempo que se tolera sin conexión al gateway (discord.py reconecta solo)
+GATEWAY_GRACE = 120
+LAG_INTERVAL = 0.5
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+class HealthServer:
+    """Liveness (/live), readiness (/ready) y métricas Prometheus (/metrics)
+
+    `components` asocia un nombre a cada objeto con `stats()`; sus valores numéricos
+    se publican como `musicbot_<nombre>_<campo>`. Si además tiene un atributo
+    `latency` ({tipo: Histogram}) se publica como histograma.
+    """
+
+    def __init__(self, bot, *, host='0.0.0.0', port=8080, components=None,
+                 max_loop_lag=MAX_LOOP_LAG):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.components = dict(components or {})
+        self.max_loop_lag = max_loop_lag
+        self.loop_lag = 0.0
+        self.loop_lag_histogram = Histogram(LAG_BUCKETS)
+        # Lo fija el bot en su primer on_ready
+        self.startup_seconds = None
+        self._readiness = []
+        self._disconnected_since = None
+        self._seen_ready = False
+        self._runner = None
+        self._monitor = None
+
+    def add_readiness_check(self, name, check):
+        """Registra una condición más para /ready (`check()` devuelve True si está lista)"""
+        self._readiness.append((name, check))
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/', self._home)
+        app.router.add_get('/ping', self._ping)
+        app.router.add_get('/live', self._live)
+        app.router.add_get('/ready', self._ready)
+        app.router.add_get('/metrics', self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._monitor = asyncio.ensure_future(self._watch_loop())
+        log.info('Servidor de salud escuchando en %s:%s', self.host, self.port)
+
+    async def stop(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _watch_loop(self):
+        """Mide cuánto tarda el loop en despertar respecto a lo pedido"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.loop_lag = max(0.0, loop.time() - started - LAG_INTERVAL)
+            self.loop_lag_histogram.observe(self.loop_lag)
+            self._track_gateway()
+
+    @property
+    def gateway_connected(self):
+        bot = self.bot
+        return bot.ws is not None and not bot.is_closed() and math.isfinite(bot.latency)
+
+    def _track_gateway(self):
+        if self.bot.is_ready():
+            self._seen_ready = True
+        if self.gateway_connected:
+            self._disconnected_since = None
+        elif self._disconnected_since is None:
+            self._disconnected_since = time.monotonic()
+
+    def liveness(self):
+        problems = []
+        if self.loop_lag > self.max_loop_lag:
+            problems.append(f'event loop con {self.loop_lag:.2f}s de retraso')
+        # Antes del primer on_ready el gateway aún está conectando: no es un fallo
+        if (self._seen_ready and self._disconnected_since is not None
+                and time.monotonic() - self._disconnected_since > GATEWAY_GRACE):
+            problems.append('sin conexión al gateway de Discord')
+        return problems
+
+    def readiness(self):
+        problems = [] if self.bot.is_ready() else ['el bot aún no está conectado']
+        problems.extend(f'{name} no está listo' for name, check in self._readiness if not check())
+        return problems
+
+    async def _home(self, request):
+        return web.Response(text='🎵 Bot de Música está activo!')
+
+    async def _ping(self, request):
+        return web.Response(text='pong')
+
+    def _status(self, problems):
+        body = {'ok': not problems, 'problems': problems, 'loop_lag': round(self.loop_lag, 4),
+                'gateway': self.gateway_connected}
+        return web.json_response(body, status=200 if not problems else 503)
+
+    async def _live(self, request):
+        return self._status(self.liveness())
+
+    async def _ready(self, request):
+        return self._status(self.readiness())
+
+    async def _metrics(self, request):
+        return web.Response(body=self.render_metrics().encode('utf-8'),
+                            headers={'Content-Type': PROMETHEUS_CONTENT_TYPE})
+
+    def render_metrics(self):
+        metrics = MetricsWriter()
+        bot = self.bot
+        metrics.add('up', 1, help='El proceso responde')
+        metrics.add('startup_seconds', self.startup_seconds, help='Tiempo desde el inicio del proceso hasta el primer on_ready')
+        metrics.add('gateway_connected', self.gateway_connected, help='Conexión al gateway de Discord')
+        if math.isfinite(bot.latency):
+            metrics.add('gateway_latency_seconds', bot.latency, help='Latencia del heartbeat del gateway')
+        metrics.add('guilds', len(bot.guilds), help='Servidores en los que está el bot')
+        metrics.add('voice_connections', len(bot.voice_clients), help='Conexiones de voz activas')
+        metrics.add('event_loop_lag_last_seconds', self.loop_lag, help='Último retraso medido del event loop')
+        metrics.histogram('event_loop_lag_seconds', self.loop_lag_histogram, help='Retraso del event loop (s)')
+        for name, component in self.components.items():
+            metrics.add_stats(name, component.stats())
+            for kind, histogram in getattr(component, 'latency', {}).items():
+                metrics.histogram(f'{name}_latency_seconds', histogram, labels={'kind': kind},
+                                  help=f'Latencia de {name} (s)')
+        return metrics.text()
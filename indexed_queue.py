@@ -0,0 +1,200 @@
+"""Secuencia por bloques con índice de Fenwick: extremos en O(1) y operaciones por posición en O(log n)"""
+import random
+from collections import deque
+from itertools import chain
+
+# Tamaño objetivo de cada bloque; un bloque se parte al doblarlo
+BLOCK_SIZE = 256
+
+
+class IndexedQueue:
+    """Cola para miles de canciones con acceso, inserción y borrado por posición
+
+    Los elementos viven en bloques (deques) de como mucho 2 * BLOCK_SIZE y un árbol
+    de Fenwick sobre el tamaño de cada bloque traduce una posición a (bloque,
+    desplazamiento) en O(log n). `popleft` y `append` son O(1) amortizado; los
+    bloques vacíos del principio se descartan de golpe cuando se acumulan.
+    """
+
+    def __init__(self, items=()):
+        self.clear()
+        for item in items:
+            self.append(item)
+
+    def clear(self):
+        self._blocks = [deque()]
+        self._tree = [0, 0]
+        self._head = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __bool__(self):
+        return self._len > 0
+
+    def __iter__(self):
+        for block in self._blocks[self._head:]:
+            yield from block
+
+    def __repr__(self):
+        return f'IndexedQueue({list(self)!r})'
+
+    # --- Árbol de Fenwick sobre los tamaños de bloque (índices 1..n) ---
+
+    def _rebuild(self):
+        """Compacta los bloques vacíos y reconstruye el árbol en O(bloques)"""
+        blocks = [block for block in self._blocks[self._head:] if block]
+        self._blocks = blocks or [deque()]
+        self._head = 0
+        tree = [0] * (len(self._blocks) + 1)
+        for i, block in enumerate(self._blocks, start=1):
+            tree[i] += len(block)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _add(self, block_index, delta):
+        i = block_index + 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, count):
+        """Número de elementos en los `count` primeros bloques"""
+        total = 0
+        tree = self._tree
+        while count > 0:
+            total += tree[count]
+            count -= count & -count
+        return total
+
+    def _push_block(self, block):
+        """Añade un bloque al final manteniendo el árbol en O(log n)"""
+        self._blocks.append(block)
+        i = len(self._blocks)
+        # El nodo i cubre los bloques (i - lowbit(i), i]
+        self._tree.append(self._prefix(i - 1) - self._prefix(i - (i & -i)) + len(block))
+
+    def _locate(self, index):
+        """Traduce una posición a (bloque, desplazamiento) por descenso binario"""
+        tree = self._tree
+        pos = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] <= index:
+                pos = nxt
+                index -= tree[nxt]
+            step >>= 1
+        return pos, index
+
+    def _normalize(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('posición fuera de la cola')
+        return index
+
+    # --- Operaciones públicas ---
+
+    def append(self, item):
+        last = self._blocks[-1]
+        if len(last) >= BLOCK_SIZE:
+            self._push_block(deque((item,)))
+        else:
+            last.append(item)
+            self._add(len(self._blocks) - 1, 1)
+        self._len += 1
+
+    def popleft(self):
+        if not self._len:
+            raise IndexError('la cola está vacía')
+        while not self._blocks[self._head]:
+            self._head += 1
+        item = self._blocks[self._head].popleft()
+        self._add(self._head, -1)
+        self._len -= 1
+        if self._head >= 32 and self._head * 2 >= len(self._blocks):
+            self._rebuild()
+        return item
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._slice(index)
+        block, offset = self._locate(self._normalize(index))
+        return self._blocks[block][offset]
+
+    def __setitem__(self, index, item):
+        block, offset = self._locate(self._normalize(index))
+        self._blocks[block][offset] = item
+
+    def _slice(self, index):
+        start, stop, step = index.indices(self._len)
+        if step != 1:
+            return [self[i] for i in range(start, stop, step)]
+        return self.page(start, stop - start)
+
+    def page(self, start, count):
+        """Devuelve `count` elementos desde `start` sin recorrer los anteriores"""
+        items = []
+        if count <= 0 or start >= self._len:
+            return items
+        block, offset = self._locate(max(start, 0))
+        blocks = self._blocks
+        while block < len(blocks) and len(items) < count:
+            current = blocks[block]
+            for i in range(offset, len(current)):
+                items.append(current[i])
+                if len(items) == count:
+                    break
+            block += 1
+            offset = 0
+        return items
+
+    def insert(self, index, item):
+        if index < 0:
+            index = max(index + self._len, 0)
+        if index >= self._len:
+            self.append(item)
+            return
+        block, offset = self._locate(index)
+        target = self._blocks[block]
+        target.insert(offset, item)
+        self._add(block, 1)
+        self._len += 1
+        if len(target) > 2 * BLOCK_SIZE:
+            # Partir el bloque cambia la numeración: reconstrucción amortizada
+            tail = deque()
+            for _ in range(len(target) // 2):
+                tail.appendleft(target.pop())
+            self._blocks.insert(block + 1, tail)
+            self._rebuild()
+
+    def pop(self, index=-1):
+        index = self._normalize(index)
+        if index == 0:
+            return self.popleft()
+        block, offset = self._locate(index)
+        target = self._blocks[block]
+        item = target[offset]
+        del target[offset]
+        self._add(block, -1)
+        self._len -= 1
+        return item
+
+    def move(self, source, destination):
+        """Mueve el elemento de `source` a `destination` (posiciones tras quitarlo)"""
+        item = self.pop(source)
+        self.insert(destination, item)
+        return item
+
+    def shuffle(self, rng=random):
+        """Mezcla la cola en O(n): se aplana, se mezcla de una vez y se rehacen bloques y árbol"""
+        items = list(chain.from_iterable(self._blocks[self._head:]))
+        rng.shuffle(items)
+        self._blocks = [deque(items[i:i + BLOCK_SIZE]) for i in range(0, len(items), BLOCK_SIZE)]
+        self._head = 0
+        self._rebuild()
@@ -0,0 +1,161 @@
+"""Logging estructurado (JSON) que no bloquea: los registros pasan por una cola a un hilo escritor"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from urllib.parse import urlsplit
+
+# Campos propios de LogRecord; el resto (los de extra=...) se publican en el JSON
+_RESERVED = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# Por servidor y mensaje, como mucho SAMPLE_BURST registros (< WARNING) cada SAMPLE_INTERVAL s
+SAMPLE_BURST = 5
+SAMPLE_INTERVAL = 60.0
+# Ventanas de muestreo a partir de las cuales se purgan las caducadas
+MAX_SAMPLE_WINDOWS = 10000
+
+_listener = None
+_sampler = None
+
+
+def redact_url(url):
+    """Esquema, host y comienzo de la ruta: sin la query, que lleva firmas, IPs y caducidad"""
+    if not url:
+        return url
+    parts = urlsplit(url)
+    if not parts.netloc:
+        return url
+    path = parts.path if len(parts.path) <= 32 else parts.path[:32] + '…'
+    return f'{parts.scheme}://{parts.netloc}{path}'
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro, con los campos de `extra` al mismo nivel"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class GuildSampler(logging.Filter):
+    """Limita los mensajes repetitivos de cada servidor
+
+    Solo afecta a registros por debajo de WARNING que llevan `guild_id`. El primer
+    registro que pasa tras una ventana con descartes indica cuántos se descartaron
+    en su campo `suppressed`.
+    """
+
+    def __init__(self, burst=SAMPLE_BURST, interval=SAMPLE_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.suppressed = 0
+        # (guild_id, plantilla del mensaje) -> [inicio de la ventana, emitidos, descartados]
+        self._windows = {}
+        # El hilo de audio (after_playing) también registra
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        guild_id = getattr(record, 'guild_id', None)
+        if guild_id is None or record.levelno >= logging.WARNING or self.burst <= 0:
+            return True
+        key = (guild_id, record.msg)
+        now = record.created
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if window is None and len(self._windows) >= MAX_SAMPLE_WINDOWS:
+                    self._prune(now)
+                if window is not None and window[2]:
+                    record.suppressed = window[2]
+                self._windows[key] = [now, 1, 0]
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed += 1
+            return False
+
+    def stats(self):
+        return {'suppressed': self.suppressed}
+
+    def _prune(self, now):
+        self._windows = {key: window for key, window in self._windows.items()
+                         if now - window[0] < self.interval}
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Encola el registro con el mensaje ya resuelto, sin aplanarlo a texto (lo formatea el escritor)"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level='INFO', *, fmt='json', stream=None, burst=SAMPLE_BURST, interval=SAMPLE_INTERVAL):
+    """Configura el logger raíz: filtro de muestreo, cola y un hilo que escribe en `stream`
+
+    Devuelve el GuildSampler, que expone con `stats()` los registros descartados.
+    """
+    global _listener, _sampler
+    _shutdown()
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    # El muestreo se aplica antes de encolar: lo descartado no cuesta ni una copia
+    _sampler = GuildSampler(burst, interval)
+    queue_handler.addFilter(_sampler)
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    set_level(level)
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    atexit.register(_shutdown)
+    return _sampler
+
+
+def _shutdown():
+    """Vacía la cola y detiene el hilo escritor (también al salir del proceso)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def set_level(level):
+    """Cambia el nivel del logger raíz en caliente; devuelve el nombre del nivel aplicado"""
+    value = logging.getLevelName(str(level).upper())
+    if not isinstance(value, int):
+        raise ValueError(f'Nivel de log desconocido: {level}')
+    logging.getLogger().setLevel(value)
+    return logging.getLevelName(value)
+
+
+def get_level():
+    return logging.getLevelName(logging.getLogger().level)
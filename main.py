@@ -1,39 +1,51 @@
+import time
+
+# Inicio del proceso: el arranque se mide desde aquí hasta el primer on_ready
+LAUNCHED_AT = time.perf_counter()
+
 import discord
 from discord.ext import commands
 import asyncio
-import yt_dlp
+import re
 import json
+import logging
 import os
-from flask import Flask
-from threading import Thread
-import shutil
+from tracks import ResolvedTrack, format_duration, format_position, parse_position
+from cache import MediaCache
+from extraction import ExtractionEngine, ExtractionTimeout, is_playlist_url
+from music_queue import QueueRegistry, Song
+from mixer import Mixer
+from filter_presets import PRESETS, get_preset
+from player import TrackPlayer
+from readahead import ReadAheadSource
+from stream_refresh import StreamRefresher
+from ffmpeg_scheduler import FFmpegScheduler
+from ffmpeg_locator import find_ffmpeg
+from audio_cache import AudioCache
+from health import HealthServer
+from logs import setup_logging, set_level as set_log_level_name, get_level
+import tracing
 
 # Cargar configuración desde variables de entorno (Replit Secrets)
 TOKEN = os.environ.get('DISCORD_TOKEN')
 PREFIX = os.environ.get('PREFIX', '!')
 
-# Detectar FFmpeg (Replit usa Nix que lo instala en diferentes rutas)
-FFMPEG_PATH = shutil.which('ffmpeg')
-if not FFMPEG_PATH:
-    print("⚠️ FFmpeg no encontrado en PATH, intentando rutas comunes...")
-    possible_paths = [
-        '/nix/store/*/bin/ffmpeg',
-        '/usr/bin/ffmpeg',
-        '/usr/local/bin/ffmpeg'
-    ]
-    for path in possible_paths:
-        if os.path.exists(path):
-            FFMPEG_PATH = path
-            break
+# Logging estructurado y no bloqueante (JSON por defecto; LOG_FORMAT=text para leerlo en consola)
+log_sampler = setup_logging(os.environ.get('LOG_LEVEL', 'INFO'), fmt=os.environ.get('LOG_FORMAT', 'json'))
+log = logging.getLogger('musicbot')
+
+# Detectar FFmpeg (Replit usa Nix que lo instala en diferentes rutas); la ruta queda guardada
+# en FFMPEG_STATE_FILE para no recorrer el store de Nix en cada reinicio
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH') or find_ffmpeg(os.environ.get('FFMPEG_STATE_FILE', '.ffmpeg_path.json'))
 
 if FFMPEG_PATH:
-    print(f"✅ FFmpeg encontrado en: {FFMPEG_PATH}")
+    log.info('Usando FFmpeg', extra={'ffmpeg': FFMPEG_PATH})
 else:
-    print("❌ FFmpeg no encontrado")
+    log.error('FFmpeg no encontrado: el audio no funcionará')
 
 # Configuración de yt-dlp optimizada para fluidez y calidad
 ytdl_format_options = {
-    'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
+    'format': 'bestaudio[acodec=opus]/bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
     'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
     'restrictfilenames': True,
     'noplaylist': True,
@@ -55,78 +67,123 @@ ffmpeg_options = {
     'options': '-vn -b:a 192k -bufsize 512k'
 }
 
-ytdl = yt_dlp.YoutubeDL(ytdl_format_options)
-
-# Flask app para mantener el bot activo (UptimeRobot)
-app = Flask(__name__)
-
-@app.route('/')
-def home():
-    return "🎵 Bot de Música está activo!"
-
-@app.route('/ping')
-def ping():
-    return "pong"
-
-def run():
-    app.run(host='0.0.0.0', port=8080)
-
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
-
-class YTDLSource(discord.PCMVolumeTransformer):
-    def __init__(self, source, *, data, volume=0.8):
-        super().__init__(source, volume)
-        self.data = data
-        self.title = data.get('title')
-        self.url = data.get('url')
-        self.thumbnail = data.get('thumbnail')
-        self.duration = self.format_duration(data.get('duration', 0))
-        self.webpage_url = data.get('webpage_url')
+# Límite global de procesos FFmpeg decodificando a la vez, repartidos por turnos entre servidores
+ffmpeg_scheduler = FFmpegScheduler(
+    int(os.environ.get('FFMPEG_MAX_PROCESSES', 32)),
+    executable=FFMPEG_PATH or 'ffmpeg'
+)
+
+# 'opus': FFmpeg entrega Opus (sin decodificar ni codificar en el bot); 'pcm': PCM + volumen en Python
+OPUS_PLAYBACK = os.environ.get('PLAYBACK_MODE', 'opus') == 'opus'
+# Fundido entre canciones en modo PCM (en Opus el paso es sin hueco, sin fundido); 0 = sin fundido
+CROSSFADE_SECONDS = float(os.environ.get('CROSSFADE_SECONDS', 0))
+# Segundos de audio que se leen de FFmpeg por delante para cubrir cortes de red (0 = sin buffer)
+READAHEAD_SECONDS = float(os.environ.get('READAHEAD_SECONDS', 2))
+# Volumen inicial de cada servidor (%, como !volume). A 100 no hay filtro volume y en Opus se copian los paquetes
+DEFAULT_VOLUME = int(os.environ.get('DEFAULT_VOLUME', 80)) / 100
+
+# Caché de búsquedas y metadatos (memoria LRU + SQLite); CACHE_PATH vacío la deja solo en memoria
+media_cache = MediaCache(
+    os.environ.get('CACHE_PATH', 'cache.sqlite3'),
+    search_ttl=int(os.environ.get('CACHE_SEARCH_TTL', 24 * 3600)),
+    metadata_ttl=int(os.environ.get('CACHE_METADATA_TTL', 7 * 24 * 3600)),
+    disk_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 50000))
+)
+
+# Caché local de audio (.opus) de las canciones ya reproducidas; AUDIO_CACHE_MAX_MB=0 la desactiva
+audio_cache = AudioCache(
+    os.environ.get('AUDIO_CACHE_DIR', 'audio_cache'),
+    max_bytes=int(os.environ.get('AUDIO_CACHE_MAX_MB', 2048)) * 1024 * 1024,
+    max_duration=int(os.environ.get('AUDIO_CACHE_MAX_DURATION', 20 * 60)),
+    executable=FFMPEG_PATH or 'ffmpeg',
+    scheduler=ffmpeg_scheduler
+)
+
+# Pool de extracción: cada worker tiene su propio YoutubeDL ('thread' o 'process')
+extractor = ExtractionEngine(
+    ytdl_format_options,
+    workers=int(os.environ.get('EXTRACTION_WORKERS', 4)),
+    mode=os.environ.get('EXTRACTION_MODE', 'thread'),
+    max_pending=int(os.environ.get('EXTRACTION_QUEUE', 64)),
+    search_timeout=float(os.environ.get('SEARCH_TIMEOUT', 15)),
+    resolve_timeout=float(os.environ.get('RESOLVE_TIMEOUT', 20)),
+    retries=int(os.environ.get('EXTRACTION_RETRIES', 1))
+)
+
+class YTDLSource(TrackPlayer):
+    def __init__(self, track, *, slot=None, volume=DEFAULT_VOLUME, preset=None):
+        # Usar FFmpeg con la ruta detectada si está disponible
+        super().__init__(track, slot=slot, volume=volume, opus=OPUS_PLAYBACK,
+                         executable=FFMPEG_PATH or 'ffmpeg', refresh=self.refresh_stream,
+                         readahead=READAHEAD_SECONDS, preset=preset, **ffmpeg_options)
 
     @classmethod
-    async def from_url(cls, url, *, loop=None, stream=False):
-        loop = loop or asyncio.get_event_loop()
-        data = await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=not stream))
+    async def from_track(cls, track, *, guild_id=None, loop=None, preset=None, volume=DEFAULT_VOLUME):
+        """Crea el reproductor reutilizando la extracción de la búsqueda si sigue vigente"""
+        with tracing.span('resolve'):
+            await cls.resolve(track, loop=loop)
+        return await cls.from_resolved(track, guild_id=guild_id, preset=preset, volume=volume)
+
+    @staticmethod
+    async def resolve(track, *, loop=None):
+        """Vuelve a resolver la pista solo si su URL de stream no llega al final de la canción"""
+        # Una copia local evita tanto la extracción como el stream remoto
+        if audio_cache.apply(track) or track.covers_playback():
+            return
+        stream = media_cache.get_stream(track.key)
+        if stream:
+            track.apply_stream(stream)
+            if track.covers_playback():
+                return
+        await YTDLSource.refresh_stream(track)
 
+    @staticmethod
+    async def refresh_stream(track):
+        """Pide a yt-dlp una URL de stream nueva aunque la actual no haya caducado"""
+        track.local_path = None
+        data = await extractor.extract(track.webpage_url)
         if 'entries' in data:
             data = data['entries'][0]
+        track.update_from_info(data)
+        await media_cache.set_track(track)
 
-        filename = data['url'] if stream else ytdl.prepare_filename(data)
-        
-        # Usar FFmpeg con la ruta detectada si está disponible
-        if FFMPEG_PATH:
-            return cls(discord.FFmpegPCMAudio(filename, executable=FFMPEG_PATH, **ffmpeg_options), data=data)
-        else:
-            return cls(discord.FFmpegPCMAudio(filename, **ffmpeg_options), data=data)
-
-    @staticmethod
-    def format_duration(seconds):
-        if not seconds:
-            return "Desconocido"
-        hours = seconds // 3600
-        minutes = (seconds % 3600) // 60
-        secs = seconds % 60
-        if hours > 0:
-            return f"{hours}:{minutes:02d}:{secs:02d}"
-        return f"{minutes}:{secs:02d}"
-
-class MusicQueue:
-    def __init__(self):
-        self.songs = []
-        self.current = None
-        self.voice_client = None
-        self.text_channel = None
-        self.is_playing = False
-
-    def add_song(self, song):
-        self.songs.append(song)
-
-    def get_next(self):
-        if self.songs:
-            return self.songs.pop(0)
-        return None
+    @classmethod
+    async def from_resolved(cls, track, *, guild_id=None, preset=None, volume=DEFAULT_VOLUME):
+        # Esperar un hueco en el planificador global antes de arrancar FFmpeg
+        with tracing.span('ffmpeg_wait'):
+            slot = await ffmpeg_scheduler.acquire(guild_id)
+        try:
+            with tracing.span('ffmpeg_spawn'):
+                return cls(track, slot=slot, volume=volume, preset=preset)
+        except Exception:
+            slot.release()
+            raise
+
+    format_duration = staticmethod(format_duration)
+
+    # Los datos de la canción se leen de la pista en lugar de copiarse en el reproductor
+    @property
+    def title(self):
+        return self.track.title
+
+    @property
+    def url(self):
+        return self.track.source_url
+
+    @property
+    def thumbnail(self):
+        return self.track.thumbnail
+
+    @property
+    def duration(self):
+        return format_duration(self.track.duration)
+
+    @property
+    def webpage_url(self):
+        return self.track.webpage_url
+
+# Renueva la URL de la canción en reproducción antes de que caduque (para reinicios y recuperaciones)
+stream_refresher = StreamRefresher(YTDLSource.refresh_stream)
 
 intents = discord.Intents.default()
 intents.message_content = True
@@ -134,62 +191,279 @@ intents.voice_states = True
 
 bot = commands.Bot(command_prefix=PREFIX, intents=intents, help_command=None)
 
-queues = {}
+# Colas por servidor: desconexión tras IDLE_TIMEOUT s sin actividad y descarte tras QUEUE_EVICT_TIMEOUT s
+queues = QueueRegistry(
+    idle_timeout=int(os.environ.get('IDLE_TIMEOUT', 300)),
+    evict_timeout=int(os.environ.get('QUEUE_EVICT_TIMEOUT', 1800)),
+    volume=DEFAULT_VOLUME
+)
+
+# Canciones por página en !queue
+QUEUE_PAGE_SIZE = 10
+# Tiempo máximo que !seek y !filter esperan al primer frame nuevo para informar de cuándo se oye
+AUDIBLE_REPORT_TIMEOUT = 10
+
+# Listas: el primer lote se encola enseguida y el resto en segundo plano, por lotes de
+# PLAYLIST_BATCH extraídos uno a uno, hasta PLAYLIST_MAX_ENTRIES
+PLAYLIST_FIRST_BATCH = 25
+PLAYLIST_BATCH = 50
+PLAYLIST_MAX_ENTRIES = int(os.environ.get('PLAYLIST_MAX_ENTRIES', 500))
+
+# Búsquedas máximas por !playmany (o !play con varias líneas o ';')
+MAX_BULK_QUERIES = 25
+
+# Latencia por etapas de !play: percentiles en !debug latency e histogramas en /metrics; TRACE_LOG=1 registra cada traza
+latency = tracing.LatencyTracker(
+    window=int(os.environ.get('LATENCY_WINDOW', 500)),
+    trace_log=os.environ.get('TRACE_LOG') == '1'
+)
+
+# Servidor de salud y métricas en el event loop del bot: / y /ping (UptimeRobot), /live, /ready y /metrics
+health_server = HealthServer(
+    bot,
+    port=int(os.environ.get('PORT', 8080)),
+    components={'extraction': extractor, 'ffmpeg': ffmpeg_scheduler, 'queues': queues,
+                'audio_cache': audio_cache, 'cache': media_cache, 'pipeline': latency,
+                'logging': log_sampler, 'player': TrackPlayer, 'stream_refresh': stream_refresher,
+                'readahead': ReadAheadSource, 'mixer': Mixer}
+)
+health_server.add_readiness_check('extraction', lambda: extractor.warmed)
+
+# Segundos desde el inicio del proceso hasta el primer on_ready (None hasta entonces)
+startup_seconds = None
 
 def get_queue(guild_id):
-    if guild_id not in queues:
-        queues[guild_id] = MusicQueue()
-    return queues[guild_id]
+    return queues.get(guild_id)
+
+def prefetch_next(queue):
+    """Pre-carga la siguiente canción mientras suena la actual"""
+    queue.schedule_prefetch(
+        # La pre-carga no cuenta en la traza de la petición que la programó
+        lambda song: tracing.detached(YTDLSource.resolve(song.track, loop=bot.loop)),
+        lambda song: YTDLSource.from_resolved(song.track, guild_id=queue.guild_id,
+                                              preset=queue.filter_preset, volume=queue.volume)
+    )
+
+def get_mixer(queue):
+    """Mixer persistente del servidor: pasa a la canción pre-cargada sin esperar al event loop"""
+    if queue.mixer is None:
+        def on_advance(player, song):
+            # Corre en el hilo de audio
+            asyncio.run_coroutine_threadsafe(advance(queue, player, song), bot.loop)
+        queue.mixer = Mixer(opus=OPUS_PLAYBACK, crossfade=CROSSFADE_SECONDS, on_advance=on_advance)
+    return queue.mixer
+
+async def advance(queue, player, song):
+    """El mixer pasó sin hueco a la canción pre-cargada: se anota como la actual"""
+    # Un !skip o !stop puede haberse adelantado a este aviso
+    if queue.mixer.current is not player or queue.current is player:
+        return
+    queue.take_handoff(song)
+    await track_started(queue, player, song)
+
+async def track_started(queue, player, song_info):
+    """Anota la canción que empieza a sonar, prepara la siguiente y la anuncia"""
+    # La pre-carga pudo crearse antes del último !volume
+    player.volume = queue.volume
+    queue.mark_started(player)
+    stream_refresher.watch(queue.guild_id, player)
+    prefetch_next(queue)
+    audio_cache.schedule_fill(player.track)
+    
+    embed = discord.Embed(
+        title="🎵 Reproduciendo ahora",
+        description=f"[{player.title}]({player.webpage_url})",
+        color=discord.Color.green()
+    )
+    embed.set_thumbnail(url=player.thumbnail)
+    embed.add_field(name="Duración", value=player.duration, inline=True)
+    embed.add_field(name="Solicitado por", value=song_info.requester, inline=True)
+    embed.timestamp = discord.utils.utcnow()
+    
+    await queue.text_channel.send(embed=embed)
 
 async def play_next(ctx):
     queue = get_queue(ctx.guild.id)
+    mixer = get_mixer(queue)
     
     if not queue.songs:
         queue.is_playing = False
+        mixer.clear()
+        stream_refresher.forget(ctx.guild.id)
         return
 
     song_info = queue.get_next()
     
     try:
-        player = await YTDLSource.from_url(song_info['url'], loop=bot.loop, stream=True)
-        queue.current = player
+        # Usar la pre-carga si existe; si no, reutilizar la extracción hecha en !play
+        player = await queue.take_prefetched(song_info)
+        if player is None:
+            player = await YTDLSource.from_track(song_info.track, guild_id=ctx.guild.id, loop=bot.loop,
+                                                 preset=queue.filter_preset, volume=queue.volume)
         
         def after_playing(error):
+            # Corre en el hilo de audio: el registro solo se encola, no escribe en stdout.
+            # El mixer solo se detiene con !skip/!stop o si la siguiente canción no estaba lista
             if error:
-                print(f'❌ Error del reproductor: {error}')
+                log.error('Error del reproductor', exc_info=error, extra={'guild_id': ctx.guild.id})
             asyncio.run_coroutine_threadsafe(play_next(ctx), bot.loop)
         
-        queue.voice_client.play(player, after=after_playing)
-        queue.is_playing = True
+        mixer.start(player)
+        queue.voice_client.play(mixer, after=after_playing)
+        trace = tracing.current()
+        if trace is not None:
+            trace.wait_first_packet(player)
+        await track_started(queue, player, song_info)
         
-        embed = discord.Embed(
-            title="🎵 Reproduciendo ahora",
-            description=f"[{player.title}]({player.webpage_url})",
-            color=discord.Color.green()
-        )
-        embed.set_thumbnail(url=player.thumbnail)
-        embed.add_field(name="Duración", value=player.duration, inline=True)
-        embed.add_field(name="Solicitado por", value=song_info['requester'], inline=True)
-        embed.timestamp = discord.utils.utcnow()
-        
-        await queue.text_channel.send(embed=embed)
-        
-    except Exception as e:
-        print(f'❌ Error al reproducir: {e}')
+    except Exception:
+        log.exception('Error al reproducir', extra={'guild_id': ctx.guild.id, 'track': song_info.track.key})
         await queue.text_channel.send('❌ Error al reproducir la canción.')
         await play_next(ctx)
 
+@bot.event
+async def setup_hook():
+    await health_server.start()
+
 @bot.event
 async def on_ready():
-    print(f'✅ Bot conectado como {bot.user.name}')
-    print(f'🎵 Servidor(es): {len(bot.guilds)}')
-    print(f'👥 Usuarios: {len(bot.users)}')
-    print(f'📝 Usa {PREFIX}help para ver los comandos')
+    global startup_seconds
+    log.info('Bot conectado como %s', bot.user.name, extra={'guilds': len(bot.guilds), 'users': len(bot.users)})
+    if startup_seconds is None:
+        startup_seconds = time.perf_counter() - LAUNCHED_AT
+        log.info('Arranque completo en %.2f s', startup_seconds, extra={'startup_seconds': round(startup_seconds, 3)})
+        health_server.startup_seconds = startup_seconds
+        # Precalentar los workers de yt-dlp (sin red) ya conectados; /ready espera a que terminen
+        asyncio.ensure_future(extractor.warm())
+    # Precalentar FFmpeg para que el primer !play tras un reinicio no arranque en frío
+    asyncio.ensure_future(ffmpeg_scheduler.warm())
     await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name=f'música | {PREFIX}help'))
 
-@bot.command(name='play', aliases=['p'])
-async def play(ctx, *, query: str):
-    """Reproduce una canción de YouTube"""
+async def search_track(query):
+    """Busca una canción, usando la caché antes de recurrir a yt-dlp"""
+    # La pista vuelve sin URL de stream: mientras espera en la cola, esta vive solo en
+    # media_cache y resolve() la recupera al llegar a la cabeza
+    cached = await media_cache.get_search(query)
+    if cached:
+        return ResolvedTrack.from_metadata(cached)
+
+    # Varias peticiones simultáneas de la misma búsqueda comparten una sola extracción
+    data = await extractor.search(query)
+
+    if 'entries' in data:
+        if not data['entries']:
+            return None
+        data = data['entries'][0]
+
+    track = ResolvedTrack.from_info(data)
+    await media_cache.set_search(query, track)
+    track.drop_stream()
+    return track
+
+def playlist_songs(data, requester):
+    """Entradas planas de una lista convertidas en canciones sin resolver"""
+    return [Song(ResolvedTrack.from_flat(entry), requester)
+            for entry in data.get('entries') or () if entry and entry.get('id')]
+
+async def enqueue_playlist(ctx, queue, url):
+    """Encola una lista: el primer lote llega con una sola petición y el resto en segundo plano"""
+    data = await extractor.extract_playlist(url, end=PLAYLIST_FIRST_BATCH)
+    entries = data.get('entries') or []
+    songs = playlist_songs(data, ctx.author.mention)
+    if not songs:
+        return await ctx.send('❌ La lista está vacía o no está disponible.')
+    
+    queue.add_songs(songs)
+    more = len(entries) >= PLAYLIST_FIRST_BATCH and PLAYLIST_MAX_ENTRIES > PLAYLIST_FIRST_BATCH
+    if more:
+        queue.ingest(ingest_playlist(ctx, queue, url))
+    
+    embed = discord.Embed(
+        title="📃 Lista añadida a la cola",
+        description=f"[{data.get('title') or url}]({url})",
+        color=discord.Color.yellow()
+    )
+    embed.add_field(name="Canciones", value=f"{len(songs)}{' (cargando el resto...)' if more else ''}", inline=True)
+    embed.add_field(name="Solicitado por", value=ctx.author.mention, inline=True)
+    embed.timestamp = discord.utils.utcnow()
+    await ctx.send(embed=embed)
+    
+    if not queue.is_playing:
+        await play_next(ctx)
+    else:
+        prefetch_next(queue)
+
+async def ingest_playlist(ctx, queue, url):
+    """Añade el resto de la lista a la cola por lotes; cada canción se resuelve al acercarse a la cabeza"""
+    for start in range(PLAYLIST_FIRST_BATCH + 1, PLAYLIST_MAX_ENTRIES + 1, PLAYLIST_BATCH):
+        end = min(start + PLAYLIST_BATCH - 1, PLAYLIST_MAX_ENTRIES)
+        # Cada lote es una extracción propia (playlist_items): se encola en cuanto llega
+        try:
+            data = await extractor.extract_playlist(url, start=start, end=end)
+        except Exception as e:
+            log.warning('Error cargando la lista: %s', e, extra={'guild_id': queue.guild_id})
+            return
+        entries = data.get('entries') or []
+        songs = playlist_songs(data, ctx.author.mention)
+        queue.add_songs(songs)
+        if songs and queue.voice_client and not queue.is_playing:
+            await play_next(ctx)
+        if len(entries) <= end - start:
+            # Lote incompleto: no quedan más entradas en la lista
+            return
+
+def split_queries(text):
+    """Separa varias búsquedas escritas en líneas distintas o con ';'"""
+    return [query.strip() for query in re.split(r'[;\n]', text) if query.strip()]
+
+async def enqueue_many(ctx, queue, queries):
+    """Busca varias canciones a la vez y las encola en el orden en que se pidieron"""
+    queries = queries[:MAX_BULK_QUERIES]
+    # Todas las búsquedas entran a la vez en el pool; se encolan en orden según van estando listas
+    tasks = [asyncio.ensure_future(search_track(query)) for query in queries]
+    added = []
+    failed = []
+    for query, task in zip(queries, tasks):
+        try:
+            track = await task
+        except ExtractionTimeout:
+            failed.append(f'⏱️ {query}')
+            continue
+        except Exception as e:
+            log.warning('Error buscando: %s', e, extra={'guild_id': queue.guild_id, 'query': query})
+            failed.append(f'❌ {query}')
+            continue
+        if track is None:
+            failed.append(f'🔍 {query}')
+            continue
+        song = Song(track, ctx.author.mention)
+        queue.add_song(song)
+        added.append(song)
+        # La primera canción encontrada empieza a sonar sin esperar al resto
+        if not queue.is_playing:
+            await play_next(ctx)
+    
+    if queue.is_playing:
+        prefetch_next(queue)
+    
+    if not added:
+        return await ctx.send('❌ No se encontró ninguna canción:\n' + '\n'.join(failed))
+    
+    lines = [f"{idx}. [{song.title}]({song.url}) - `{song.duration}`" for idx, song in enumerate(added[:10], start=1)]
+    if len(added) > 10:
+        lines.append(f"... y {len(added) - 10} más")
+    embed = discord.Embed(
+        title=f"➕ {len(added)} canción(es) añadida(s) a la cola",
+        description='\n'.join(lines),
+        color=discord.Color.yellow()
+    )
+    if failed:
+        embed.add_field(name="No añadidas", value='\n'.join(failed)[:1024], inline=False)
+    embed.add_field(name="Solicitado por", value=ctx.author.mention, inline=True)
+    embed.timestamp = discord.utils.utcnow()
+    await ctx.send(embed=embed)
+
+async def handle_play(ctx, query):
+    """Conecta al canal de voz, busca lo pedido y lo reproduce o lo encola"""
     
     if not ctx.author.voice:
         return await ctx.reply('❌ Debes estar en un canal de voz.')
@@ -198,50 +472,71 @@ async def play(ctx, *, query: str):
     queue = get_queue(ctx.guild.id)
     
     if not queue.voice_client or not queue.voice_client.is_connected():
-        queue.voice_client = await voice_channel.connect()
+        with tracing.span('voice_connect'):
+            queue.voice_client = await voice_channel.connect()
         queue.text_channel = ctx.channel
     
     await ctx.send('🔍 Buscando...')
     
     try:
-        loop = bot.loop or asyncio.get_event_loop()
-        data = await loop.run_in_executor(None, lambda: ytdl.extract_info(f"ytsearch:{query}", download=False))
+        if is_playlist_url(query):
+            return await enqueue_playlist(ctx, queue, query.strip())
         
-        if 'entries' in data:
-            if not data['entries']:
-                return await ctx.send('❌ No se encontraron resultados.')
-            data = data['entries'][0]
+        queries = split_queries(query)
+        if len(queries) > 1:
+            return await enqueue_many(ctx, queue, queries)
         
-        song_info = {
-            'url': data['webpage_url'],
-            'title': data['title'],
-            'thumbnail': data.get('thumbnail'),
-            'duration': YTDLSource.format_duration(data.get('duration', 0)),
-            'requester': ctx.author.mention
-        }
+        with tracing.span('search'):
+            track = await search_track(query)
+        
+        if track is None:
+            return await ctx.send('❌ No se encontraron resultados.')
+        
+        song_info = Song(track, ctx.author.mention)
         
         queue.add_song(song_info)
         
         if not queue.is_playing:
             await play_next(ctx)
         else:
+            prefetch_next(queue)
             embed = discord.Embed(
                 title="➕ Añadido a la cola",
-                description=f"[{song_info['title']}]({song_info['url']})",
+                description=f"[{song_info.title}]({song_info.url})",
                 color=discord.Color.yellow()
             )
-            embed.set_thumbnail(url=song_info['thumbnail'])
+            embed.set_thumbnail(url=song_info.thumbnail)
             embed.add_field(name="Posición", value=str(len(queue.songs)), inline=True)
-            embed.add_field(name="Duración", value=song_info['duration'], inline=True)
-            embed.add_field(name="Solicitado por", value=song_info['requester'], inline=True)
+            embed.add_field(name="Duración", value=song_info.duration, inline=True)
+            embed.add_field(name="Solicitado por", value=song_info.requester, inline=True)
             embed.timestamp = discord.utils.utcnow()
             
             await ctx.send(embed=embed)
             
+    except ExtractionTimeout:
+        await ctx.send('⏱️ La búsqueda tardó demasiado. Inténtalo de nuevo.')
     except Exception as e:
-        print(f'❌ Error: {e}')
+        log.exception('Error en comando play', extra={'guild_id': ctx.guild.id})
         await ctx.send('❌ Error al procesar el video.')
 
+@bot.command(name='play', aliases=['p'])
+async def play(ctx, *, query: str):
+    """Reproduce una canción de YouTube"""
+    # Traza desde que Discord recibió el mensaje hasta el primer paquete de audio enviado
+    trace = latency.start('play', guild_id=ctx.guild.id,
+                          gateway=(discord.utils.utcnow() - ctx.message.created_at).total_seconds())
+    try:
+        await handle_play(ctx, query)
+    finally:
+        # Si la canción empezó a sonar, la traza la cierra su primer paquete
+        if not trace.pending_first_packet:
+            trace.finish()
+
+@bot.command(name='playmany', aliases=['pm'])
+async def playmany(ctx, *, queries: str):
+    """Encola varias canciones a la vez (una por línea o separadas por ';')"""
+    await ctx.invoke(play, query=queries)
+
 @bot.command(name='pause')
 async def pause(ctx):
     """Pausa la reproducción"""
@@ -281,7 +576,7 @@ async def stop(ctx):
     queue = get_queue(ctx.guild.id)
     
     if queue.voice_client:
-        queue.songs.clear()
+        queue.clear()
         queue.voice_client.stop()
         await queue.voice_client.disconnect()
         queue.voice_client = None
@@ -305,17 +600,117 @@ async def volume(ctx, vol: int = None):
     if vol < 0 or vol > 200:
         return await ctx.reply('❌ El volumen debe estar entre 0 y 200.')
     
-    queue.current.volume = vol / 100
+    queue.volume = queue.current.volume = vol / 100
     await ctx.send(f'🔊 Volumen ajustado a **{vol}%**')
 
+async def seek_to(ctx, target):
+    """Salta a `target` (segundos, o una función de la posición actual) en la canción actual"""
+    queue = get_queue(ctx.guild.id)
+    player = queue.current
+    
+    if not player or not queue.voice_client:
+        return await ctx.reply('❌ No hay nada reproduciéndose.')
+    if callable(target):
+        target = target(player.position)
+    
+    started = time.perf_counter()
+    applied, on_applied = tracing.callback_future()
+    track = player.track
+    try:
+        # Se reutiliza la URL ya resuelta; solo se re-extrae si no llega hasta el final
+        if not track.is_local and not track.covers_playback(target):
+            await YTDLSource.refresh_stream(track)
+        position = player.seek(target, on_applied=on_applied)
+    except Exception as e:
+        log.exception('Error al saltar de posición', extra={'guild_id': ctx.guild.id})
+        return await ctx.reply(f'❌ No se pudo saltar: {str(e)[:100]}')
+    
+    message = f'⏩ **{format_position(position)}** / {player.duration}'
+    if not queue.voice_client.is_paused():
+        try:
+            audible = await asyncio.wait_for(applied, timeout=AUDIBLE_REPORT_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            latency.observe('seek', audible - started)
+            message += f' · se oye en {(audible - started) * 1000:.0f} ms'
+    await ctx.send(message)
+
+@bot.command(name='seek')
+async def seek(ctx, position: str):
+    """Salta a una posición de la canción (segundos, m:ss o h:mm:ss)"""
+    try:
+        seconds = parse_position(position)
+    except ValueError:
+        return await ctx.reply(f'❌ Uso: `{PREFIX}seek 1:30` o `{PREFIX}seek 90`')
+    await seek_to(ctx, seconds)
+
+@bot.command(name='forward', aliases=['ff'])
+async def forward(ctx, seconds: int = 10):
+    """Avanza en la canción actual"""
+    await seek_to(ctx, lambda current: current + abs(seconds))
+
+@bot.command(name='rewind', aliases=['rw'])
+async def rewind(ctx, seconds: int = 10):
+    """Retrocede en la canción actual"""
+    await seek_to(ctx, lambda current: current - abs(seconds))
+
+@bot.command(name='filter', aliases=['fx'])
+async def audio_filter(ctx, name: str = None):
+    """Activa un preset de filtros (bassboost, nightcore, normalize) o lo quita con off"""
+    queue = get_queue(ctx.guild.id)
+    names = ', '.join(f'`{preset}`' for preset in PRESETS)
+    
+    if name is None:
+        current = queue.filter_preset.name if queue.filter_preset else 'off'
+        return await ctx.send(f'🎛️ Preset actual: **{current}**. Disponibles: {names} y `off`')
+    try:
+        preset = get_preset(name)
+    except KeyError:
+        return await ctx.reply(f'❌ Preset desconocido. Disponibles: {names} y `off`')
+    
+    queue.filter_preset = preset
+    label = preset.name if preset else 'off'
+    if queue.songs and queue.is_playing:
+        # La siguiente canción se pre-cargó con el preset anterior
+        queue.cancel_prefetch()
+        prefetch_next(queue)
+    
+    player = queue.current
+    if not player or player.closed or not queue.voice_client:
+        return await ctx.send(f'🎛️ Preset **{label}** para las próximas canciones')
+    
+    started = time.perf_counter()
+    applied, on_applied = tracing.callback_future()
+    try:
+        # Solo se relanza FFmpeg en la posición actual con la URL ya resuelta
+        player.set_preset(preset, on_applied=on_applied)
+    except Exception as e:
+        log.exception('Error al cambiar el preset de filtros', extra={'guild_id': ctx.guild.id})
+        return await ctx.reply(f'❌ No se pudo aplicar el preset: {str(e)[:100]}')
+    
+    message = f'🎛️ Preset **{label}**'
+    if not queue.voice_client.is_paused():
+        try:
+            audible = await asyncio.wait_for(applied, timeout=AUDIBLE_REPORT_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            latency.observe('filter', audible - started)
+            message += f' · se oye en {(audible - started) * 1000:.0f} ms'
+    await ctx.send(message)
+
 @bot.command(name='queue', aliases=['q'])
-async def show_queue(ctx):
+async def show_queue(ctx, page: int = 1):
     """Muestra la cola de reproducción"""
     queue = get_queue(ctx.guild.id)
     
     if not queue.songs and not queue.current:
         return await ctx.reply('❌ La cola está vacía.')
     
+    pages = max(1, -(-len(queue.songs) // QUEUE_PAGE_SIZE))
+    page = min(max(page, 1), pages)
+    
     embed = discord.Embed(
         title="📜 Cola de reproducción",
         color=discord.Color.blue()
@@ -324,17 +719,97 @@ async def show_queue(ctx):
     description_lines = []
     
     if queue.current:
-        description_lines.append(f"▶️ [{queue.current.title}]({queue.current.webpage_url}) - `{queue.current.duration}`")
+        description_lines.append(f"▶️ [{queue.current.title}]({queue.current.webpage_url}) - `{format_position(queue.current.position)} / {queue.current.duration}`")
     
-    for idx, song in enumerate(queue.songs[:9], start=1):
-        description_lines.append(f"{idx}. [{song['title']}]({song['url']}) - `{song['duration']}`")
+    start = (page - 1) * QUEUE_PAGE_SIZE
+    for idx, song in enumerate(queue.page(page, QUEUE_PAGE_SIZE), start=start + 1):
+        description_lines.append(f"{idx}. [{song.title}]({song.url}) - `{song.duration}`")
     
     embed.description = '\n'.join(description_lines)
-    embed.set_footer(text=f"Total: {len(queue.songs) + (1 if queue.current else 0)} canción(es)")
+    embed.set_footer(text=f"Página {page}/{pages} · Total: {len(queue.songs) + (1 if queue.current else 0)} canción(es)")
     embed.timestamp = discord.utils.utcnow()
     
     await ctx.send(embed=embed)
 
+@bot.command(name='remove', aliases=['rm'])
+async def remove(ctx, position: int):
+    """Quita una canción de la cola por su posición"""
+    queue = get_queue(ctx.guild.id)
+    
+    if not queue.songs:
+        return await ctx.reply('❌ La cola está vacía.')
+    
+    if not 1 <= position <= len(queue.songs):
+        return await ctx.reply(f'❌ Posición no válida (1-{len(queue.songs)}).')
+    
+    song = queue.remove(position - 1)
+    prefetch_next(queue)
+    await ctx.send(f'🗑️ Quitada de la cola: **{song.title}**')
+
+@bot.command(name='move', aliases=['mv'])
+async def move(ctx, source: int, destination: int):
+    """Mueve una canción a otra posición de la cola"""
+    queue = get_queue(ctx.guild.id)
+    total = len(queue.songs)
+    
+    if not total:
+        return await ctx.reply('❌ La cola está vacía.')
+    
+    if not (1 <= source <= total and 1 <= destination <= total):
+        return await ctx.reply(f'❌ Posición no válida (1-{total}).')
+    
+    song = queue.move(source - 1, destination - 1)
+    prefetch_next(queue)
+    await ctx.send(f'↕️ **{song.title}** movida a la posición {destination}')
+
+@bot.command(name='shuffle')
+async def shuffle(ctx):
+    """Mezcla la cola de reproducción"""
+    queue = get_queue(ctx.guild.id)
+    
+    if len(queue.songs) < 2:
+        return await ctx.reply('❌ No hay suficientes canciones en la cola.')
+    
+    queue.shuffle()
+    prefetch_next(queue)
+    await ctx.message.add_reaction('🔀')
+
+async def set_log_level(ctx, level):
+    """Muestra o cambia en caliente el nivel de log (solo el dueño del bot)"""
+    if level is None:
+        return await ctx.reply(f'📝 Nivel de log actual: `{get_level()}`')
+    if not await bot.is_owner(ctx.author):
+        return await ctx.reply('❌ Solo el dueño del bot puede cambiar el nivel de log.')
+    try:
+        applied = set_log_level_name(level)
+    except ValueError:
+        return await ctx.reply('❌ Nivel desconocido. Usa DEBUG, INFO, WARNING o ERROR.')
+    log.warning('Nivel de log cambiado a %s', applied, extra={'user_id': ctx.author.id})
+    await ctx.reply(f'📝 Nivel de log: `{applied}`')
+
+@bot.command(name='debug')
+async def debug(ctx, what: str = 'latency', value: str = None):
+    """Diagnóstico: percentiles de latencia de cada etapa de !play o nivel de log"""
+    if what == 'loglevel':
+        return await set_log_level(ctx, value)
+    if what != 'latency':
+        return await ctx.reply(f'❌ Uso: `{PREFIX}debug latency` o `{PREFIX}debug loglevel [nivel]`')
+    
+    rows = latency.report()
+    if not rows:
+        return await ctx.reply('📭 Aún no hay mediciones de latencia.')
+    
+    lines = [f"{'etapa':<14}{'n':>5}{'p50':>9}{'p95':>9}{'p99':>9}"]
+    for stage, count, *values in rows:
+        lines.append(f"{stage:<14}{count:>5}" + ''.join(f"{value * 1000:>7.0f}ms" for value in values))
+    embed = discord.Embed(
+        title="⏱️ Latencia de !play por etapa",
+        description="```\n" + '\n'.join(lines) + "\n```",
+        color=discord.Color.blue()
+    )
+    embed.set_footer(text=f"Últimas {latency.window} mediciones por etapa")
+    await ctx.send(embed=embed)
+
 @bot.command(name='help')
 async def help_command(ctx):
     """Muestra la ayuda"""
@@ -346,7 +821,12 @@ async def help_command(ctx):
     
     embed.add_field(
         name=f"{PREFIX}play <URL o nombre>",
-        value="Reproduce una canción de YouTube (alias: !p)",
+        value="Reproduce una canción o una lista de YouTube (alias: !p)",
+        inline=False
+    )
+    embed.add_field(
+        name=f"{PREFIX}playmany <canción; canción; ...>",
+        value="Busca varias canciones a la vez y las encola en orden (alias: !pm)",
         inline=False
     )
     embed.add_field(
@@ -375,10 +855,50 @@ async def help_command(ctx):
         inline=False
     )
     embed.add_field(
-        name=f"{PREFIX}queue",
+        name=f"{PREFIX}seek <posición>",
+        value="Salta a una posición de la canción: segundos, m:ss o h:mm:ss",
+        inline=False
+    )
+    embed.add_field(
+        name=f"{PREFIX}forward [segundos]",
+        value="Avanza en la canción, 10 s por defecto (alias: !ff)",
+        inline=False
+    )
+    embed.add_field(
+        name=f"{PREFIX}rewind [segundos]",
+        value="Retrocede en la canción, 10 s por defecto (alias: !rw)",
+        inline=False
+    )
+    embed.add_field(
+        name=f"{PREFIX}filter [preset]",
+        value="Preset de filtros: bassboost, nightcore, normalize u off (alias: !fx)",
+        inline=False
+    )
+    embed.add_field(
+        name=f"{PREFIX}queue [página]",
         value="Muestra la cola de reproducción (alias: !q)",
         inline=False
     )
+    embed.add_field(
+        name=f"{PREFIX}remove <posición>",
+        value="Quita una canción de la cola (alias: !rm)",
+        inline=False
+    )
+    embed.add_field(
+        name=f"{PREFIX}move <desde> <hasta>",
+        value="Mueve una canción a otra posición (alias: !mv)",
+        inline=False
+    )
+    embed.add_field(
+        name=f"{PREFIX}shuffle",
+        value="Mezcla la cola de reproducción",
+        inline=False
+    )
+    embed.add_field(
+        name=f"{PREFIX}debug latency | loglevel [nivel]",
+        value="Muestra p50/p95/p99 de cada etapa de !play (búsqueda, FFmpeg, primer paquete...) o el nivel de log (cambiarlo: solo el dueño)",
+        inline=False
+    )
     embed.add_field(
         name=f"{PREFIX}help",
         value="Muestra este mensaje de ayuda",
@@ -391,5 +911,5 @@ async def help_command(ctx):
     await ctx.send(embed=embed)
 
 if __name__ == '__main__':
-    keep_alive()  # Inicia el servidor web para UptimeRobot
-    bot.run(TOKEN)
+    # El logging ya está configurado: sin el handler propio de discord.py se duplicaría cada línea
+    bot.run(TOKEN, log_handler=None)
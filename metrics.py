@@ -0,0 +1,86 @@
+"""Métricas en formato de texto de Prometheus, sin dependencias externas"""
+import bisect
+import math
+
+# Límites superiores (segundos) de los histogramas de latencia
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+class Histogram:
+    """Histograma acumulativo con cubetas fijas, como los de Prometheus"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and math.isnan(value):
+        return 'NaN'
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class MetricsWriter:
+    """Acumula muestras y declara HELP/TYPE una sola vez por nombre"""
+
+    def __init__(self, prefix='musicbot'):
+        self.prefix = prefix
+        self._lines = []
+        self._declared = set()
+
+    def _declare(self, name, kind, help):
+        if name in self._declared:
+            return
+        self._declared.add(name)
+        if help:
+            self._lines.append(f'# HELP {name} {help}')
+        self._lines.append(f'# TYPE {name} {kind}')
+
+    def add(self, name, value, *, labels=None, kind='gauge', help=''):
+        if value is None or isinstance(value, str):
+            return
+        name = f'{self.prefix}_{name}'
+        self._declare(name, kind, help)
+        self._lines.append(f'{name}{_labels(labels)} {_number(value)}')
+
+    def add_stats(self, name, stats, *, labels=None):
+        """Vuelca un diccionario de stats() (anidado o no) como gauges; ignora los textos"""
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                self.add_stats(f'{name}_{key}', value, labels=labels)
+            elif isinstance(value, (bool, int, float)):
+                self.add(f'{name}_{key}', value, labels=labels)
+
+    def histogram(self, name, histogram, *, labels=None, help=''):
+        name = f'{self.prefix}_{name}'
+        self._declare(name, 'histogram', help)
+        labels = dict(labels or {})
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (math.inf,), histogram.counts):
+            cumulative += count
+            bucket_labels = {**labels, 'le': '+Inf' if math.isinf(bound) else repr(float(bound))}
+            self._lines.append(f'{name}_bucket{_labels(bucket_labels)} {cumulative}')
+        self._lines.append(f'{name}_sum{_labels(labels)} {histogram.sum!r}')
+        self._lines.append(f'{name}_count{_labels(labels)} {histogram.count}')
+
+    def text(self):
+        return '\n'.join(self._lines) + '\n'
@@ -0,0 +1,162 @@
+"""Mezcla persistente por servidor: paso sin hueco a la siguiente canción y fundido opcional en PCM"""
+import threading
+
+import discord
+
+from readahead import FRAME_SECONDS
+
+# La siguiente canción arranca su FFmpeg 15 s antes del final (PREFETCH_FFMPEG_LEAD): el fundido cabe holgado
+MAX_CROSSFADE = 10.0
+
+
+class Mixer(discord.AudioSource):
+    """AudioSource que se mantiene entre canciones
+
+    Lee de la pista actual y, cuando termina, pasa en la misma lectura a la que
+    está en espera (`queue_next`): el reproductor de discord.py no se detiene
+    entre canciones y no hay hueco. En modo PCM y con `crossfade` > 0, los últimos
+    `crossfade` segundos de una pista se solapan con el comienzo de la siguiente
+    con un fundido de igual potencia. Los paquetes Opus no se pueden mezclar sin
+    decodificarlos, así que en modo Opus el paso es solo sin hueco.
+
+    `on_advance(player, song)` se llama desde el hilo de audio al pasar a la pista
+    en espera. discord.py llama a cleanup() cada vez que se detiene, así que las
+    pistas no se liberan ahí sino en start(), clear() y al terminar.
+    """
+
+    # Contadores de todo el proceso para /metrics
+    handoffs = 0
+    crossfades = 0
+
+    def __init__(self, *, opus=True, crossfade=0.0, on_advance=None):
+        self.opus = opus
+        self.crossfade = 0.0 if opus else min(max(0.0, crossfade), MAX_CROSSFADE)
+        self.on_advance = on_advance
+        self._lock = threading.Lock()
+        self._current = None
+        # (player, song) pre-cargados para el paso sin hueco
+        self._pending = None
+        # Pista que se desvanece durante el fundido
+        self._outgoing = None
+        self._fade_frames = max(1, round(self.crossfade / FRAME_SECONDS))
+        self._faded = 0
+        self._fader = None
+        if self.crossfade:
+            # NumPy solo hace falta para mezclar: se importa aquí como en TrackPlayer
+            from audio import Crossfader
+            self._fader = Crossfader(self._fade_frames)
+
+    @property
+    def current(self):
+        return self._current
+
+    def start(self, player):
+        """Pone `player` a sonar ya (reproducción nueva o !skip) y libera lo que sonaba"""
+        with self._lock:
+            stale = [p for p in (self._current, self._outgoing) if p is not None and p is not player]
+            self._current = player
+            self._outgoing = None
+            if self._pending is not None and self._pending[0] is player:
+                self._pending = None
+        for old in stale:
+            old.cleanup()
+
+    def clear(self):
+        """Libera la pista actual y la que se desvanece; la de espera sigue siendo de la cola"""
+        self.start(None)
+
+    def queue_next(self, player, song):
+        """Deja `player` en espera para pasar a él sin hueco cuando termine la actual"""
+        with self._lock:
+            self._pending = (player, song)
+
+    def release_pending(self, player):
+        """Retira `player` de la espera; False si la mezcla ya lo está reproduciendo"""
+        with self._lock:
+            if self._pending is not None and self._pending[0] is player:
+                self._pending = None
+            return player is not self._current and player is not self._outgoing
+
+    def read(self):
+        ended = []
+        advanced = []
+        data = self._read(ended, advanced)
+        # Matar FFmpeg y avisar al event loop, fuera del candado
+        for player in ended:
+            player.cleanup()
+        if self.on_advance is not None:
+            for player, song in advanced:
+                self.on_advance(player, song)
+        return data
+
+    def _read(self, ended, advanced):
+        # Las pistas se leen fuera del candado: un FFmpeg atascado no debe bloquear
+        # start() (play_next tras !skip) ni al event loop. Solo los punteros van con candado
+        with self._lock:
+            outgoing = self._outgoing
+            current = self._current
+        if outgoing is not None:
+            data = self._fade(outgoing, current, ended)
+            if data:
+                return data
+        while True:
+            with self._lock:
+                current = self._current
+            if current is None:
+                return b''
+            data = current.read()
+            with self._lock:
+                if current is not self._current:
+                    # start() la sustituyó durante la lectura (y ya la liberó): se descarta lo leído
+                    continue
+                if data:
+                    if self._fader is not None and self._pending is not None and self._near_end(current):
+                        self._outgoing = current
+                        self._faded = 0
+                        self._advance(advanced)
+                        Mixer.crossfades += 1
+                    return data
+                ended.append(current)
+                self._current = None
+                if self._advance(advanced):
+                    Mixer.handoffs += 1
+
+    def _fade(self, outgoing, current, ended):
+        leaving = outgoing.read()
+        finished = not leaving or self._faded >= self._fade_frames
+        incoming = current.read() if not finished and current is not None else b''
+        with self._lock:
+            if outgoing is not self._outgoing:
+                # start() cortó el fundido durante la lectura
+                return b''
+            if finished:
+                ended.append(outgoing)
+                self._outgoing = None
+                return b''
+        index = self._faded
+        self._faded += 1
+        return self._fader.mix(leaving, incoming, index)
+
+    def _near_end(self, player):
+        duration = player.track.duration
+        return bool(duration) and player.position >= duration - self.crossfade
+
+    def _advance(self, advanced):
+        if self._pending is None:
+            return False
+        player, song = self._pending
+        self._pending = None
+        self._current = player
+        advanced.append((player, song))
+        return True
+
+    def is_opus(self):
+        return self.opus
+
+    def cleanup(self):
+        # discord.py la llama al detenerse: la mezcla sobrevive a !skip y a las pausas del reproductor
+        pass
+
+    @classmethod
+    def stats(cls):
+        return {'handoffs': cls.handoffs, 'crossfades': cls.crossfades}
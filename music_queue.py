@@ -0,0 +1,295 @@
+"""Cola de reproducción por servidor con pre-carga de la siguiente canción"""
+import asyncio
+import logging
+import random
+import time
+
+from indexed_queue import IndexedQueue
+from timers import TimerHeap
+from tracks import format_duration
+
+log = logging.getLogger(__name__)
+
+# Segundos antes del final de la canción actual en los que se arranca el FFmpeg de la siguiente
+PREFETCH_FFMPEG_LEAD = 15
+# Sin actividad: desconexión del canal de voz y, más tarde, descarte de la cola
+DEFAULT_IDLE_TIMEOUT = 300
+DEFAULT_EVICT_TIMEOUT = 1800
+
+
+class Song:
+    """Entrada de la cola: la pista resuelta y quién la pidió"""
+    __slots__ = ('track', 'requester')
+
+    def __init__(self, track, requester):
+        self.track = track
+        self.requester = requester
+
+    @property
+    def title(self):
+        return self.track.title
+
+    @property
+    def url(self):
+        return self.track.webpage_url
+
+    @property
+    def thumbnail(self):
+        return self.track.thumbnail
+
+    @property
+    def duration(self):
+        return format_duration(self.track.duration)
+
+
+class MusicQueue:
+    def __init__(self, guild_id=None, *, volume=1.0):
+        self.guild_id = guild_id
+        self.songs = IndexedQueue()
+        self.current = None
+        self.voice_client = None
+        self.text_channel = None
+        self.is_playing = False
+        self.started_at = None
+        # Mixer persistente del servidor (lo crea el bot al reproducir por primera vez)
+        self.mixer = None
+        # FilterPreset de !filter, que se aplica también a las siguientes canciones
+        self.filter_preset = None
+        # Volumen de !volume, que se mantiene entre canciones
+        self.volume = volume
+        self._prefetch_song = None
+        self._prefetch_task = None
+        self._prefetch_needed = None
+        self._ingestion = set()
+
+    def add_song(self, song):
+        self.songs.append(song)
+
+    def add_songs(self, songs):
+        for song in songs:
+            self.songs.append(song)
+
+    def ingest(self, coro):
+        """Ejecuta en segundo plano la carga de una lista; clear() la cancela"""
+        task = asyncio.ensure_future(coro)
+        self._ingestion.add(task)
+        task.add_done_callback(self._ingestion.discard)
+        return task
+
+    def get_next(self):
+        if self.songs:
+            return self.songs.popleft()
+        return None
+
+    def remove(self, index):
+        """Quita la canción en la posición `index` (desde 0) y la devuelve"""
+        song = self.songs.pop(index)
+        self._check_head()
+        return song
+
+    def move(self, source, destination):
+        """Mueve una canción de posición (desde 0) y la devuelve"""
+        song = self.songs.move(source, destination)
+        self._check_head()
+        return song
+
+    def shuffle(self, rng=random):
+        self.songs.shuffle(rng)
+        self._check_head()
+
+    def page(self, number, size=10):
+        """Canciones de la página `number` (desde 1) de la cola"""
+        return self.songs.page((number - 1) * size, size)
+
+    def _check_head(self):
+        # Si la cabeza cambió, la pre-carga ya no sirve; el llamante la vuelve a programar
+        if self._prefetch_song is not None and (not self.songs or self.songs[0] is not self._prefetch_song):
+            self.cancel_prefetch()
+
+    def clear(self):
+        """Vacía la cola, detiene la carga de listas y descarta la canción pre-cargada"""
+        for task in list(self._ingestion):
+            task.cancel()
+        self.songs.clear()
+        self.cancel_prefetch()
+
+    async def disconnect(self):
+        """Vacía la cola y sale del canal de voz"""
+        self.clear()
+        voice_client, self.voice_client = self.voice_client, None
+        self.is_playing = False
+        if voice_client is not None:
+            voice_client.stop()
+            await voice_client.disconnect()
+
+    def mark_started(self, player):
+        """Registra la canción que acaba de empezar a sonar"""
+        self.current = player
+        self.started_at = time.monotonic()
+        self.is_playing = True
+
+    def schedule_prefetch(self, resolve, build):
+        """Resuelve en segundo plano la cabeza de la cola y prepara su FFmpeg
+
+        `resolve(song)` es una corrutina que deja la pista lista para reproducir y
+        `build(song)` otra que crea el AudioSource (arrancando FFmpeg). Si hay mixer,
+        el AudioSource queda en espera en él para pasar sin hueco.
+        """
+        head = self.songs[0] if self.songs else None
+        if head is not None and head is self._prefetch_song:
+            return
+        self.cancel_prefetch()
+        if head is None:
+            return
+        self._prefetch_song = head
+        self._prefetch_needed = asyncio.Event()
+        self._prefetch_task = asyncio.ensure_future(
+            self._prefetch(head, resolve, build, self._prefetch_needed, self._ffmpeg_delay())
+        )
+
+    async def _prefetch(self, song, resolve, build, needed, delay):
+        await resolve(song)
+        # FFmpeg solo se arranca cerca del final para no mantener conexiones ociosas
+        if delay > 0 and not needed.is_set():
+            try:
+                await asyncio.wait_for(needed.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+        player = await build(song)
+        if self.mixer is not None:
+            self.mixer.queue_next(player, song)
+        return player
+
+    def _ffmpeg_delay(self):
+        track = getattr(self.current, 'track', None)
+        if not track or not track.duration or self.started_at is None:
+            return 0
+        elapsed = time.monotonic() - self.started_at
+        return max(0, track.duration - elapsed - PREFETCH_FFMPEG_LEAD)
+
+    async def take_prefetched(self, song):
+        """Devuelve el AudioSource pre-cargado para `song`, o None si no lo hay"""
+        if song is not self._prefetch_song or self._prefetch_task is None:
+            self.cancel_prefetch()
+            return None
+        task = self._prefetch_task
+        self._prefetch_needed.set()
+        self._prefetch_song = None
+        self._prefetch_task = None
+        self._prefetch_needed = None
+        try:
+            return await task
+        except asyncio.CancelledError:
+            return None
+        except Exception as e:
+            # Se reintenta por el camino normal, que ya informa del error
+            log.warning('Fallo en la pre-carga de %s: %s', song.title, e)
+            return None
+
+    def cancel_prefetch(self):
+        """Cancela la pre-carga en curso y libera el FFmpeg que ya se hubiera arrancado"""
+        task = self._prefetch_task
+        self._prefetch_song = None
+        self._prefetch_task = None
+        self._prefetch_needed = None
+        if task is None:
+            return
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled() and task.exception() is None:
+            player = task.result()
+            # Si el mixer ya pasó a ella, la pista está sonando y no se libera
+            if self.mixer is None or self.mixer.release_pending(player):
+                player.cleanup()
+
+    def take_handoff(self, song):
+        """El mixer pasó por su cuenta a la canción pre-cargada `song`: se saca de la cola"""
+        if song is self._prefetch_song:
+            self._prefetch_song = None
+            self._prefetch_task = None
+            self._prefetch_needed = None
+        if self.songs and self.songs[0] is song:
+            self.songs.popleft()
+
+
+def _connected(queue):
+    return queue.voice_client is not None and queue.voice_client.is_connected()
+
+
+class QueueRegistry:
+    """Colas por servidor que se desconectan y se descartan tras un tiempo sin actividad
+
+    Todas las esperas viven en un único TimerHeap: no hay una tarea por servidor.
+    Cada acceso con `get` renueva el plazo; al vencer, si sigue sonando se vuelve
+    a programar, si está conectado sin sonar se desconecta, y si ya estaba
+    desconectado la cola se elimina del registro. Tras desconectar por
+    inactividad, `get` no renueva el plazo hasta que vuelva a conectarse: así la
+    cola se elimina a los `evict_timeout` segundos aunque se siga consultando.
+    """
+
+    def __init__(self, *, idle_timeout=DEFAULT_IDLE_TIMEOUT, evict_timeout=DEFAULT_EVICT_TIMEOUT, volume=1.0):
+        self.idle_timeout = idle_timeout
+        self.evict_timeout = max(evict_timeout, idle_timeout)
+        # Volumen con el que empieza cada cola nueva
+        self.volume = volume
+        self.idle_disconnects = 0
+        self.evicted = 0
+        self._queues = {}
+        # Servidores desconectados por inactividad, a la espera de eliminar su cola
+        self._evicting = set()
+        self._timers = TimerHeap(self._expire)
+
+    def __len__(self):
+        return len(self._queues)
+
+    def __contains__(self, guild_id):
+        return guild_id in self._queues
+
+    def values(self):
+        return self._queues.values()
+
+    def get(self, guild_id):
+        """Devuelve (creándola si hace falta) la cola del servidor y renueva su plazo"""
+        queue = self._queues.get(guild_id)
+        if queue is None:
+            queue = self._queues[guild_id] = MusicQueue(guild_id, volume=self.volume)
+        if guild_id in self._evicting:
+            # disconnect() para el reproductor y su after vuelve a pedir la cola:
+            # eso no puede devolverla al plazo de inactividad
+            if not _connected(queue):
+                return queue
+            self._evicting.discard(guild_id)
+        self._timers.schedule(guild_id, self.idle_timeout)
+        return queue
+
+    async def _expire(self, guild_id):
+        queue = self._queues.get(guild_id)
+        if queue is None:
+            return None
+        voice_client = queue.voice_client
+        if voice_client is not None and voice_client.is_playing():
+            return self.idle_timeout
+        if guild_id in self._evicting and _connected(queue):
+            # Se volvió a conectar antes de eliminarla: vuelve al plazo normal
+            self._evicting.discard(guild_id)
+            return self.idle_timeout
+        if _connected(queue):
+            log.info('Servidor %s inactivo: desconectando', guild_id)
+            self.idle_disconnects += 1
+            self._evicting.add(guild_id)
+            await queue.disconnect()
+            return self.evict_timeout - self.idle_timeout
+        self._evicting.discard(guild_id)
+        del self._queues[guild_id]
+        queue.clear()
+        self.evicted += 1
+        return None
+
+    def stats(self):
+        connected = sum(1 for queue in self._queues.values() if _connected(queue))
+        lengths = [len(queue.songs) for queue in self._queues.values()]
+        return {
+            'live': len(self._queues), 'connected': connected,
+            'queued_songs': sum(lengths), 'longest_queue': max(lengths, default=0),
+            'idle_disconnects': self.idle_disconnects, 'evicted': self.evicted,
+        }
@@ -0,0 +1,361 @@
+"""Fuente de audio de una pista: FFmpeg reiniciable en cualquier posición, en Opus o PCM"""
+import asyncio
+import logging
+import shlex
+import threading
+import time
+
+import discord
+
+from readahead import ReadAheadSource
+
+log = logging.getLogger(__name__)
+
+# Cada lectura de un AudioSource de discord.py son 20 ms de audio
+FRAME_SECONDS = 0.02
+OPUS_BITRATE = 128
+# Un FFmpeg que termina a más de esto del final de la pista se considera caído (URL caducada, 403, reset)
+EARLY_EXIT_MARGIN = 5.0
+# Recuperaciones por pista y tiempo máximo en silencio esperando cada una
+MAX_RECOVERIES = 3
+RECOVERY_TIMEOUT = 20.0
+# Espera máxima a que el FFmpeg nuevo de un cambio de filtros alcance al que suena
+HANDOVER_TIMEOUT = 1.0
+OPUS_SILENCE = b'\xf8\xff\xfe'
+PCM_SILENCE = bytes(discord.opus.Encoder.FRAME_SIZE)
+
+
+def _without_reconnect(before_options):
+    """Quita las opciones -reconnect* (solo válidas para HTTP) al leer un archivo local"""
+    args = shlex.split(before_options)
+    kept = []
+    i = 0
+    while i < len(args):
+        if args[i].startswith('-reconnect'):
+            i += 2
+            continue
+        kept.append(args[i])
+        i += 1
+    return shlex.join(kept)
+
+
+class TrackPlayer(discord.AudioSource):
+    """Reproduce una pista resuelta y sabe reiniciar FFmpeg en la posición actual
+
+    En modo Opus, FFmpeg entrega paquetes Opus listos para enviar: si la fuente ya es
+    Opus y no hay filtros ni cambio de volumen se copian sin transcodificar, y si no
+    es el propio FFmpeg quien aplica el volumen y codifica. El proceso del bot no
+    decodifica, escala ni codifica ningún frame. En modo PCM el volumen se aplica
+    en proceso con GainTransformer.
+
+    Si FFmpeg termina antes de tiempo y hay `refresh` (corrutina que obtiene una URL
+    de stream nueva para la pista), se entrega silencio mientras se re-resuelve en
+    el event loop y FFmpeg vuelve a arrancar en la posición en la que se cortó.
+
+    Con `readahead` > 0, cada FFmpeg se lee a través de un ReadAheadSource que
+    mantiene hasta ese número de segundos leídos por delante. Entonces los cambios
+    de volumen (Opus) y de preset no cortan el audio: el FFmpeg actual sigue
+    sonando hasta que el nuevo tiene en su buffer el audio que le toca.
+
+    `preset` es un FilterPreset (filtros que se añaden tras `filters` y factor de
+    velocidad con el que avanza la posición).
+    """
+
+    # Contadores de todo el proceso para /metrics
+    early_exits = 0
+    recovered = 0
+    recovery_failures = 0
+
+    def __init__(self, track, *, volume=1.0, opus=True, executable='ffmpeg',
+                 before_options='', options='', filters=(), slot=None, refresh=None,
+                 readahead=0.0, preset=None):
+        self.track = track
+        # Hueco del FFmpegScheduler: se libera al terminar la pista
+        self.slot = slot
+        self.opus = opus
+        self.executable = executable
+        self.before_options = before_options
+        self.options = options
+        self.filters = list(filters)
+        self.readahead = readahead
+        self.preset = preset
+        self._speed = preset.speed if preset is not None else 1.0
+        self._volume = volume
+        self._offset = 0.0
+        self._frames = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        # Callbacks a llamar con el primer frame que se entregue (trazas, !seek, !filter)
+        self._first_frame = []
+        self.refresh = refresh
+        self._loop = asyncio.get_running_loop() if refresh is not None else None
+        self.recoveries = 0
+        self._recovering_since = None
+        # FFmpeg nuevo a la espera de alcanzar al actual: (fuente, buffer, posición, velocidad)
+        self._incoming = None
+        self._on_applied = None
+        self._source = None
+        self._source, _ = self._spawn(0.0)
+
+    @property
+    def position(self):
+        """Segundos reproducidos de la pista, contados por frames entregados (no por los del buffer)"""
+        return self._offset + self._frames * FRAME_SECONDS * self._speed
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def volume(self):
+        return self._volume
+
+    @volume.setter
+    def volume(self, value):
+        value = max(value, 0.0)
+        if value == self._volume:
+            return
+        self._volume = value
+        if self.opus:
+            # El volumen lo aplica FFmpeg: se relanza en la posición actual
+            if not self._closed:
+                self._handover(self._speed)
+        else:
+            self._source.volume = value
+
+    def _filter_chain(self):
+        filters = list(self.filters)
+        if self.preset is not None:
+            filters.extend(self.preset.filters)
+        if self.opus and self._volume != 1.0:
+            filters.append(f'volume={self._volume:.3f}')
+        return filters
+
+    def _spawn(self, position):
+        """Arranca FFmpeg en `position`; devuelve (AudioSource, ReadAheadSource o None)"""
+        source = self._create_source(position)
+        if self.slot is not None:
+            self.slot.attach(source)
+        buffer = None
+        if self.readahead > 0:
+            source = buffer = ReadAheadSource(source, self.readahead)
+        if self.opus:
+            return source, buffer
+        # NumPy solo hace falta en modo PCM: se importa aquí para no pagarlo en cada arranque
+        from audio import GainTransformer
+        # La ganancia va después del buffer para que !volume no espere a vaciarlo
+        return GainTransformer(source, volume=self._volume), buffer
+
+    def _create_source(self, position):
+        before_options = self.before_options
+        if self.track.is_local:
+            before_options = _without_reconnect(before_options)
+        if position > 0:
+            # -ss antes de -i: búsqueda en la entrada, salta directamente al keyframe
+            before_options = f'-ss {position:.3f} {before_options}'.strip()
+        filters = self._filter_chain()
+        options = self.options
+        if filters:
+            options = f'{options} -filter:a "{",".join(filters)}"'.strip()
+
+        if self.opus:
+            # Sin filtros y con Opus de origen basta con copiar los paquetes
+            source_opus = self.track.is_local or self.track.acodec == 'opus'
+            codec = 'opus' if not filters and source_opus else None
+            return discord.FFmpegOpusAudio(
+                self.track.source_url, bitrate=OPUS_BITRATE, codec=codec,
+                executable=self.executable, before_options=before_options, options=options,
+            )
+        return discord.FFmpegPCMAudio(
+            self.track.source_url, executable=self.executable,
+            before_options=before_options, options=options,
+        )
+
+    def restart(self, position=None, *, speed=None, on_applied=None):
+        """Arranca un FFmpeg nuevo en `position` (por defecto la actual) y descarta el anterior
+
+        `on_applied()` se llama (desde el hilo de audio) al entregar el primer frame
+        del FFmpeg nuevo.
+        """
+        if self._closed:
+            raise RuntimeError('La pista ya terminó')
+        if position is None:
+            position = self.position
+        source, _ = self._spawn(position)
+        with self._lock:
+            if self._closed:
+                source.cleanup()
+                return
+            old = self._source
+            self._source = source
+            self._offset = position
+            self._frames = 0
+            if speed is not None:
+                self._speed = speed
+            self._recovering_since = None
+            stale, self._incoming = self._incoming, None
+            self._arm_applied()
+            if on_applied is not None:
+                # Junto con el cambio de fuente: ninguna lectura puede colarse entre ambos
+                self._first_frame.append(on_applied)
+        old.cleanup()
+        if stale is not None:
+            stale[0].cleanup()
+
+    def set_preset(self, preset, *, on_applied=None):
+        """Cambia el preset de filtros en la posición actual
+
+        `on_applied()` se llama (desde el hilo de audio) al entregar el primer frame
+        con el preset nuevo.
+        """
+        self.preset = preset
+        self._on_applied = on_applied
+        self._handover(preset.speed if preset is not None else 1.0)
+
+    def _handover(self, speed):
+        """Relanza FFmpeg con los filtros actuales sin cortar el audio (si hay lectura adelantada)"""
+        if self._closed:
+            raise RuntimeError('La pista ya terminó')
+        if self.readahead <= 0 or self._recovering_since is not None:
+            self.restart(speed=speed)
+            return
+        position = self.position
+        source, buffer = self._spawn(position)
+        with self._lock:
+            if self._closed:
+                source.cleanup()
+                return
+            stale = self._incoming
+            self._incoming = (source, buffer, position, speed, time.monotonic())
+        if stale is not None:
+            stale[0].cleanup()
+
+    def _take_incoming(self):
+        """Pasa al FFmpeg nuevo si ya alcanzó al actual; devuelve la fuente a liberar o None"""
+        source, buffer, position, speed, since = self._incoming
+        # Frames del FFmpeg nuevo que corresponden a lo que el actual ya ha sonado
+        behind = max(0, round((self.position - position) / (FRAME_SECONDS * speed)))
+        if buffer.available <= behind and not buffer.finished:
+            if time.monotonic() - since < HANDOVER_TIMEOUT:
+                return None
+            # La red no da para alcanzarlo: se acepta repetir un poco de audio antes que cortar
+            behind = buffer.available
+        for _ in range(behind):
+            if not buffer.read():
+                break
+        old = self._source
+        self._source = source
+        self._offset = position
+        self._frames = behind
+        self._speed = speed
+        self._incoming = None
+        self._arm_applied()
+        return old
+
+    def _arm_applied(self):
+        if self._on_applied is not None:
+            self._first_frame.append(self._on_applied)
+            self._on_applied = None
+
+    def seek(self, position, *, on_applied=None):
+        """Salta a `position` segundos (acotada a la pista) reiniciando solo FFmpeg; devuelve la posición aplicada
+
+        `on_applied()` se llama como en restart(), con el primer frame de la posición nueva.
+        """
+        position = max(0.0, position)
+        if self.track.duration:
+            position = min(position, max(0.0, self.track.duration - 1))
+        self.restart(position, on_applied=on_applied)
+        return position
+
+    def on_first_frame(self, callback):
+        """Llama a `callback()` (desde el hilo de audio) al entregar el siguiente frame"""
+        with self._lock:
+            self._first_frame.append(callback)
+
+    def read(self):
+        while True:
+            replaced = None
+            with self._lock:
+                if self._incoming is not None:
+                    replaced = self._take_incoming()
+                source = self._source
+            if replaced is not None:
+                replaced.cleanup()
+            # Fuera del candado: un FFmpeg atascado no debe bloquear restart() ni cleanup(),
+            # que son los que lo matan y desbloquean esta lectura
+            data = source.read()
+            with self._lock:
+                if source is not self._source and not self._closed:
+                    # Se reinició durante la lectura: lo leído del FFmpeg anterior se descarta
+                    continue
+                if data:
+                    self._frames += 1
+                elif not self._closed and (self._recovering_since is not None or self._exited_early()):
+                    data = self._recovery_frame()
+                callbacks = None
+                if data and self._first_frame:
+                    callbacks, self._first_frame = self._first_frame, []
+            break
+        if callbacks:
+            for callback in callbacks:
+                callback()
+        return data
+
+    def _exited_early(self):
+        duration = self.track.duration
+        return (self.refresh is not None and not self._closed and bool(duration)
+                and self.recoveries < MAX_RECOVERIES and self.position < duration - EARLY_EXIT_MARGIN)
+
+    def _recovery_frame(self):
+        """Silencio mientras se recupera la pista; b'' (fin) si se agota el plazo"""
+        now = time.monotonic()
+        if self._recovering_since is None:
+            self._recovering_since = now
+            self.recoveries += 1
+            TrackPlayer.early_exits += 1
+            log.warning('FFmpeg terminó antes de tiempo; re-resolviendo la pista',
+                        extra={'track': self.track.key, 'position': round(self.position, 1),
+                               'duration': self.track.duration})
+            asyncio.run_coroutine_threadsafe(self._recover(self.position), self._loop)
+        elif now - self._recovering_since > RECOVERY_TIMEOUT:
+            self._recovering_since = None
+            self.recoveries = MAX_RECOVERIES
+            return b''
+        return OPUS_SILENCE if self.opus else PCM_SILENCE
+
+    async def _recover(self, position):
+        try:
+            await self.refresh(self.track)
+            if self._closed:
+                return
+            self.restart(position)
+        except Exception:
+            TrackPlayer.recovery_failures += 1
+            log.exception('No se pudo recuperar la pista', extra={'track': self.track.key})
+            with self._lock:
+                # Sin más intentos: la siguiente lectura vacía termina la pista
+                self._recovering_since = None
+                self.recoveries = MAX_RECOVERIES
+        else:
+            TrackPlayer.recovered += 1
+
+    @classmethod
+    def stats(cls):
+        return {'early_exits': cls.early_exits, 'recovered': cls.recovered,
+                'recovery_failures': cls.recovery_failures}
+
+    def is_opus(self):
+        return self.opus
+
+    def cleanup(self):
+        with self._lock:
+            self._closed = True
+            source = self._source
+            incoming, self._incoming = self._incoming, None
+        if source is not None:
+            source.cleanup()
+        if incoming is not None:
+            incoming[0].cleanup()
+        if self.slot is not None:
+            self.slot.release()
@@ -0,0 +1,154 @@
+"""Lectura adelantada: un hilo llena un buffer circular acotado con los frames de FFmpeg"""
+import logging
+import math
+import threading
+import time
+from array import array
+
+import discord
+
+log = logging.getLogger(__name__)
+
+FRAME_SECONDS = 0.02
+# Un paquete Opus de 20 ms ocupa como mucho 1275 bytes más el byte TOC (RFC 6716)
+OPUS_MAX_PACKET = 1276
+PCM_FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+
+
+class ReadAheadSource(discord.AudioSource):
+    """Envuelve un AudioSource de FFmpeg y lee hasta `seconds` de audio por delante
+
+    Un hilo propio lee de la tubería de FFmpeg y guarda los frames en un buffer
+    circular preasignado (un slot de tamaño fijo por frame), de modo que un corte
+    breve de la red se cubre con lo ya leído en lugar de oírse como un tartamudeo.
+    El hilo de audio de discord.py solo copia el frame siguiente del buffer; si lo
+    encuentra vacío espera (como haría con la tubería) y lo cuenta como underrun.
+    La memoria por stream es fija: slots × tamaño máximo de frame.
+    """
+
+    # Contadores de todo el proceso para /metrics
+    streams = 0
+    buffered_bytes = 0
+    underruns = 0
+    underrun_seconds = 0.0
+    _stats_lock = threading.Lock()
+
+    def __init__(self, original, seconds):
+        self.original = original
+        self.opus = original.is_opus()
+        self.capacity = max(1, math.ceil(seconds / FRAME_SECONDS))
+        self.slot_size = OPUS_MAX_PACKET if self.opus else PCM_FRAME_SIZE
+        self._ring = bytearray(self.capacity * self.slot_size)
+        self._view = memoryview(self._ring)
+        self._lengths = array('H', bytes(2 * self.capacity))
+        self._head = 0
+        self._count = 0
+        self._eof = False
+        self._closed = False
+        self._delivered = False
+        self.underruns = 0
+        self.underrun_seconds = 0.0
+        self._cond = threading.Condition()
+        with ReadAheadSource._stats_lock:
+            ReadAheadSource.streams += 1
+            ReadAheadSource.buffered_bytes += len(self._ring)
+        self._thread = threading.Thread(target=self._fill, name='readahead', daemon=True)
+        self._thread.start()
+
+    @property
+    def buffered(self):
+        """Segundos de audio leídos y aún no entregados"""
+        return self._count * FRAME_SECONDS
+
+    @property
+    def available(self):
+        """Frames leídos y aún no entregados"""
+        return self._count
+
+    @property
+    def finished(self):
+        """FFmpeg terminó (o falló): no llegarán más frames que los del buffer"""
+        return self._eof
+
+    def _fill(self):
+        cond = self._cond
+        try:
+            while True:
+                with cond:
+                    while self._count == self.capacity and not self._closed:
+                        cond.wait()
+                    if self._closed:
+                        return
+                # Fuera del candado: la lectura de la tubería es lo que puede bloquear
+                data = self.original.read()
+                size = len(data)
+                if size > self.slot_size:
+                    raise ValueError(f'Frame de {size} bytes, mayor que el slot ({self.slot_size})')
+                with cond:
+                    if self._closed:
+                        return
+                    if not data:
+                        self._eof = True
+                        cond.notify_all()
+                        return
+                    tail = (self._head + self._count) % self.capacity
+                    offset = tail * self.slot_size
+                    self._view[offset:offset + size] = data
+                    self._lengths[tail] = size
+                    self._count += 1
+                    cond.notify_all()
+        except Exception:
+            if not self._closed:
+                log.exception('Error leyendo de FFmpeg')
+            with cond:
+                self._eof = True
+                cond.notify_all()
+
+    def read(self):
+        cond = self._cond
+        with cond:
+            if not self._count and not self._eof and not self._closed:
+                # Antes del primer frame es el arranque de FFmpeg, no un corte
+                stalled = self._delivered
+                started = time.perf_counter()
+                while not self._count and not self._eof and not self._closed:
+                    cond.wait()
+                if stalled:
+                    self._record_underrun(time.perf_counter() - started)
+            if not self._count:
+                return b''
+            head = self._head
+            offset = head * self.slot_size
+            data = bytes(self._view[offset:offset + self._lengths[head]])
+            self._head = (head + 1) % self.capacity
+            self._count -= 1
+            self._delivered = True
+            cond.notify_all()
+        return data
+
+    def _record_underrun(self, seconds):
+        self.underruns += 1
+        self.underrun_seconds += seconds
+        with ReadAheadSource._stats_lock:
+            ReadAheadSource.underruns += 1
+            ReadAheadSource.underrun_seconds += seconds
+
+    def is_opus(self):
+        return self.opus
+
+    def cleanup(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        # Matar FFmpeg desbloquea al hilo lector si estaba esperando en la tubería
+        self.original.cleanup()
+        with ReadAheadSource._stats_lock:
+            ReadAheadSource.streams -= 1
+            ReadAheadSource.buffered_bytes -= len(self._ring)
+
+    @classmethod
+    def stats(cls):
+        return {'streams': cls.streams, 'buffered_bytes': cls.buffered_bytes,
+                'underruns': cls.underruns, 'underrun_seconds': round(cls.underrun_seconds, 3)}
@@ -0,0 +1,65 @@
+"""Renovación de la URL de stream de las pistas que suenan, antes de que caduque"""
+import logging
+import time
+
+from timers import TimerHeap
+
+log = logging.getLogger(__name__)
+
+# Antelación con la que se pide la URL nueva (la caché de streams ya no la sirve 120 s antes)
+REFRESH_LEAD = 300
+# Espera antes de reintentar una renovación fallida
+RETRY_DELAY = 30
+
+
+class StreamRefresher:
+    """Mantiene vigente la URL de la pista en reproducción de cada servidor
+
+    El FFmpeg en marcha conserva su conexión, pero cualquier reinicio (volumen,
+    recuperación tras un corte) necesita una URL válida: se renueva antes de que
+    caduque para no tener que extraer en el peor momento. `refresh(track)` es una
+    corrutina que obtiene una URL nueva para la pista.
+    """
+
+    def __init__(self, refresh, *, lead=REFRESH_LEAD):
+        self._refresh = refresh
+        self.lead = lead
+        self._players = {}
+        self._timers = TimerHeap(self._fire)
+        self.refreshed = 0
+        self.failed = 0
+
+    def _delay(self, track):
+        return max(0.0, track.expires_at - self.lead - time.time())
+
+    def watch(self, key, player):
+        """Vigila la pista de `player` (sustituye a la anterior de `key`)"""
+        track = player.track
+        if track.is_local or track.expires_at is None:
+            self.forget(key)
+            return
+        self._players[key] = player
+        self._timers.schedule(key, self._delay(track))
+
+    def forget(self, key):
+        self._players.pop(key, None)
+        self._timers.cancel(key)
+
+    async def _fire(self, key):
+        player = self._players.get(key)
+        if player is None or player.closed or player.track.is_local:
+            self._players.pop(key, None)
+            return None
+        try:
+            await self._refresh(player.track)
+        except Exception as e:
+            self.failed += 1
+            log.warning('No se pudo renovar la URL de stream: %s', e, extra={'guild_id': key})
+            return RETRY_DELAY
+        self.refreshed += 1
+        if self._players.get(key) is not player or player.track.expires_at is None:
+            return None
+        return max(self._delay(player.track), RETRY_DELAY)
+
+    def stats(self):
+        return {'watched': len(self._players), 'refreshed': self.refreshed, 'failed': self.failed}
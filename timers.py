@@ -0,0 +1,89 @@
+"""Temporizadores por clave sobre un único montículo y una sola tarea asyncio"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+class TimerHeap:
+    """Programa `callback(key)` cuando vence el plazo de cada clave
+
+    Reprogramar una clave no borra su entrada anterior del montículo: se descarta
+    al salir si ya no coincide con el plazo vigente. Si la corrutina devuelve un
+    número, la clave se vuelve a programar con ese retardo.
+    """
+
+    def __init__(self, callback):
+        self._callback = callback
+        self._deadlines = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._task = None
+        self._wakeup = None
+        self.fired = 0
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, key):
+        return key in self._deadlines
+
+    def schedule(self, key, delay):
+        deadline = time.monotonic() + delay
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._compact()
+        self._ensure_running()
+        if self._heap[0][0] == deadline:
+            # El nuevo plazo es el más próximo: despertar al bucle para que recalcule la espera
+            self._wakeup.set()
+
+    def cancel(self, key):
+        self._deadlines.pop(key, None)
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if self._deadlines.get(entry[2]) == entry[0]]
+        heapq.heapify(self._heap)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            deadline, _, key = self._heap[0]
+            if self._deadlines.get(key) != deadline:
+                heapq.heappop(self._heap)
+                continue
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            del self._deadlines[key]
+            self.fired += 1
+            try:
+                again = await self._callback(key)
+            except Exception:
+                log.exception('Error en el temporizador de %s', key)
+                continue
+            # Si durante el callback alguien reprogramó la clave, manda ese plazo
+            if again is not None and key not in self._deadlines:
+                self.schedule(key, again)
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,155 @@
+"""Latencia por etapas de cada petición (!play → primer paquete de audio) con id de petición"""
+import asyncio
+import contextvars
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from metrics import Histogram
+
+trace_log = logging.getLogger('musicbot.trace')
+
+# Orden en el que se muestran las etapas en !debug latency
+STAGES = ('gateway', 'voice_connect', 'search', 'resolve', 'ffmpeg_wait', 'ffmpeg_spawn', 'first_packet', 'total')
+DEFAULT_WINDOW = 500
+
+_current = contextvars.ContextVar('trace', default=None)
+
+
+class Trace:
+    """Etapas medidas de una petición; cada etapa se registra una sola vez"""
+
+    def __init__(self, tracker, name, request_id, guild_id):
+        self.tracker = tracker
+        self.name = name
+        self.request_id = request_id
+        self.guild_id = guild_id
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.finished = False
+        self.pending_first_packet = False
+        self._loop = asyncio.get_running_loop()
+
+    def record(self, stage, seconds):
+        if self.finished or stage in self.spans:
+            return
+        self.spans[stage] = seconds
+        self.tracker.observe(stage, seconds)
+
+    def wait_first_packet(self, player):
+        """Cierra la traza cuando `player` entregue su primer frame (desde el hilo de audio)"""
+        if self.finished or self.pending_first_packet:
+            return
+        self.pending_first_packet = True
+        submitted = time.perf_counter()
+
+        def on_first_frame():
+            elapsed = time.perf_counter() - submitted
+            self._loop.call_soon_threadsafe(self._first_packet, elapsed)
+
+        player.on_first_frame(on_first_frame)
+
+    def _first_packet(self, elapsed):
+        self.record('first_packet', elapsed)
+        self.finish()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.record('total', time.perf_counter() - self.started)
+        self.finished = True
+        self.tracker.completed += 1
+        if self.tracker.trace_log:
+            trace_log.info(json.dumps({
+                'request_id': self.request_id, 'name': self.name, 'guild_id': self.guild_id,
+                'spans_ms': {stage: round(seconds * 1000, 1) for stage, seconds in self.spans.items()},
+            }))
+
+
+class LatencyTracker:
+    """Histogramas por etapa (para /metrics) y ventana móvil para percentiles"""
+
+    def __init__(self, *, window=DEFAULT_WINDOW, trace_log=False):
+        self.window = window
+        self.trace_log = trace_log
+        self.latency = {}
+        self.samples = {}
+        self.started = 0
+        self.completed = 0
+
+    def start(self, name, *, guild_id=None, gateway=None):
+        """Abre una traza y la deja como actual en este contexto asyncio"""
+        trace = Trace(self, name, uuid.uuid4().hex[:12], guild_id)
+        self.started += 1
+        if gateway is not None:
+            # El total cuenta desde que Discord recibió el mensaje, no desde que llegó al bot
+            gateway = max(0.0, gateway)
+            trace.started -= gateway
+            trace.record('gateway', gateway)
+        _current.set(trace)
+        return trace
+
+    def observe(self, stage, seconds):
+        histogram = self.latency.get(stage)
+        if histogram is None:
+            histogram = self.latency[stage] = Histogram()
+            self.samples[stage] = deque(maxlen=self.window)
+        histogram.observe(seconds)
+        self.samples[stage].append(seconds)
+
+    def percentiles(self, stage, quantiles=(0.5, 0.95, 0.99)):
+        """Percentiles (rango más cercano) de la ventana móvil de una etapa"""
+        samples = sorted(self.samples.get(stage, ()))
+        if not samples:
+            return None
+        return [samples[min(len(samples) - 1, max(0, round(q * len(samples)) - 1))] for q in quantiles]
+
+    def report(self):
+        """Filas (etapa, muestras, p50, p95, p99) en el orden del pipeline"""
+        rows = []
+        for stage in STAGES + tuple(sorted(set(self.samples) - set(STAGES))):
+            values = self.percentiles(stage)
+            if values is not None:
+                rows.append((stage, len(self.samples[stage]), *values))
+        return rows
+
+    def stats(self):
+        # Las trazas que nunca llegan a sonar (errores, FFmpeg sin audio) no se completan
+        return {'started': self.started, 'completed': self.completed}
+
+
+def current():
+    return _current.get()
+
+
+async def detached(awaitable):
+    """Ejecuta `awaitable` sin traza; para tareas en segundo plano que heredan el contexto"""
+    _current.set(None)
+    return await awaitable
+
+
+def callback_future():
+    """(future, callback): el callback, desde cualquier hilo, completa el future con el instante (perf_counter)"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(at):
+        if not future.done():
+            future.set_result(at)
+
+    return future, lambda: loop.call_soon_threadsafe(resolve, time.perf_counter())
+
+
+@contextmanager
+def span(stage):
+    """Mide el bloque como etapa `stage` de la traza actual (no hace nada si no la hay)"""
+    trace = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.record(stage, time.perf_counter() - started)
@@ -0,0 +1,224 @@
+"""Pistas resueltas: metadatos y URL de stream reutilizables entre búsqueda y reproducción"""
+import math
+import os
+import re
+import time
+from urllib.parse import urlparse, parse_qs
+
+# Margen (segundos) antes de la caducidad en el que ya no se reutiliza la URL
+EXPIRY_MARGIN = 60
+# Vida asumida para URLs de stream que no indican cuándo caducan
+DEFAULT_STREAM_TTL = 3 * 3600
+
+_EXPIRE_PATH = re.compile(r'/expire/(\d+)')
+
+
+def parse_expiry(stream_url, default_ttl=DEFAULT_STREAM_TTL):
+    """Calcula el instante (epoch) en el que caduca una URL de stream"""
+    parsed = urlparse(stream_url)
+    expire = parse_qs(parsed.query).get('expire')
+    if expire:
+        try:
+            return float(expire[0])
+        except ValueError:
+            pass
+    # Los manifiestos de googlevideo llevan la caducidad en la ruta
+    match = _EXPIRE_PATH.search(parsed.path)
+    if match:
+        return float(match.group(1))
+    return time.time() + default_ttl
+
+
+def format_duration(seconds):
+    """Duración en formato h:mm:ss o m:ss"""
+    if not seconds:
+        return "Desconocido"
+    return format_position(seconds)
+
+
+def format_position(seconds):
+    """Posición en formato h:mm:ss o m:ss (0:00 al empezar)"""
+    seconds = int(seconds)
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    secs = seconds % 60
+    if hours > 0:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+def parse_position(text):
+    """Segundos de un texto `s`, `m:ss` o `h:mm:ss`; ValueError si no es válido"""
+    seconds = 0.0
+    for part in text.strip().split(':'):
+        value = float(part)
+        if value < 0 or not math.isfinite(value):
+            raise ValueError(text)
+        seconds = seconds * 60 + value
+    return seconds
+
+
+def _intern_headers(headers):
+    """Comparte un único dict entre las pistas con las mismas cabeceras HTTP
+
+    yt-dlp devuelve las mismas cabeceras para casi todos los vídeos de un sitio;
+    así miles de pistas en cola no guardan cada una su copia.
+    """
+    if not headers:
+        return _NO_HEADERS
+    key = tuple(sorted(headers.items()))
+    shared = _HEADERS.get(key)
+    if shared is None:
+        if len(_HEADERS) >= _MAX_SHARED_HEADERS:
+            _HEADERS.clear()
+        shared = _HEADERS[key] = dict(headers)
+    return shared
+
+
+_NO_HEADERS = {}
+_HEADERS = {}
+_MAX_SHARED_HEADERS = 256
+
+
+class ResolvedTrack:
+    """Resultado de una extracción de yt-dlp listo para reproducirse sin volver a extraer
+
+    Solo guarda los campos que necesitan la reproducción y los embeds: nunca el
+    diccionario completo de yt-dlp (lista de formatos, miniaturas...).
+    """
+    __slots__ = ('webpage_url', 'video_id', 'extractor', 'title', 'thumbnail', 'duration',
+                 'stream_url', 'expires_at', 'ext', 'acodec', 'abr', 'http_headers', 'local_path')
+
+    def __init__(self, webpage_url, title, *, video_id=None, extractor=None,
+                 thumbnail=None, duration=0, stream_url=None, expires_at=None,
+                 ext=None, acodec=None, abr=None, http_headers=None):
+        self.webpage_url = webpage_url
+        self.video_id = video_id
+        self.extractor = extractor
+        self.title = title
+        self.thumbnail = thumbnail
+        self.duration = duration or 0
+        self.stream_url = stream_url
+        # None = no caduca (p. ej. un archivo descargado)
+        self.expires_at = expires_at
+        self.ext = ext
+        self.acodec = acodec
+        self.abr = abr
+        self.http_headers = _intern_headers(http_headers)
+        # Copia en la caché local de audio (Ogg Opus), si la hay
+        self.local_path = None
+
+    @classmethod
+    def from_info(cls, data):
+        """Construye la pista a partir del diccionario de extract_info"""
+        track = cls(data.get('webpage_url'), data.get('title'))
+        track.update_from_info(data)
+        return track
+
+    def update_from_info(self, data):
+        """Actualiza metadatos y URL de stream con una nueva extracción"""
+        self.webpage_url = data.get('webpage_url') or self.webpage_url
+        self.video_id = data.get('id') or self.video_id
+        self.extractor = data.get('extractor_key') or data.get('extractor') or self.extractor
+        self.title = data.get('title') or self.title
+        self.thumbnail = data.get('thumbnail') or self.thumbnail
+        self.duration = data.get('duration') or self.duration
+        self.stream_url = data.get('url')
+        self.expires_at = parse_expiry(self.stream_url) if self.stream_url else None
+        # Solo se guarda el formato elegido, no la lista completa de formatos
+        self.ext = data.get('ext')
+        self.acodec = data.get('acodec')
+        self.abr = data.get('abr')
+        self.http_headers = _intern_headers(data.get('http_headers'))
+
+    @classmethod
+    def from_flat(cls, entry):
+        """Pista sin resolver a partir de una entrada de extracción plana de una lista"""
+        thumbnails = entry.get('thumbnails') or ()
+        thumbnail = entry.get('thumbnail') or (thumbnails[-1].get('url') if thumbnails else None)
+        video_id = entry.get('id')
+        url = entry.get('url') or entry.get('webpage_url')
+        if url and not url.startswith('http') and video_id:
+            url = f'https://www.youtube.com/watch?v={video_id}'
+        return cls(
+            url, entry.get('title') or url, video_id=video_id,
+            extractor=entry.get('ie_key') or entry.get('extractor_key'),
+            thumbnail=thumbnail, duration=entry.get('duration') or 0,
+        )
+
+    @classmethod
+    def from_metadata(cls, metadata):
+        """Reconstruye una pista (sin URL de stream) desde la caché de metadatos"""
+        return cls(
+            metadata['webpage_url'], metadata['title'],
+            video_id=metadata.get('id'), extractor=metadata.get('extractor'),
+            thumbnail=metadata.get('thumbnail'), duration=metadata.get('duration', 0),
+        )
+
+    @property
+    def key(self):
+        """Clave estable de la pista (extractor + id) para las cachés"""
+        if self.video_id:
+            return f"{self.extractor or 'generic'}:{self.video_id}"
+        return self.webpage_url
+
+    def to_metadata(self):
+        return {
+            'webpage_url': self.webpage_url, 'title': self.title, 'id': self.video_id,
+            'extractor': self.extractor, 'thumbnail': self.thumbnail, 'duration': self.duration,
+        }
+
+    def stream_state(self):
+        """Campos que dependen de la URL de stream (caducan antes que los metadatos)"""
+        return {
+            'stream_url': self.stream_url, 'expires_at': self.expires_at, 'ext': self.ext,
+            'acodec': self.acodec, 'abr': self.abr, 'http_headers': self.http_headers,
+        }
+
+    def apply_stream(self, state):
+        self.stream_url = state['stream_url']
+        self.expires_at = state['expires_at']
+        self.ext = state.get('ext')
+        self.acodec = state.get('acodec')
+        self.abr = state.get('abr')
+        self.http_headers = _intern_headers(state.get('http_headers'))
+
+    def drop_stream(self):
+        """Olvida la URL de stream y su formato; la pista vuelve a resolverse al llegar a la cabeza
+
+        Las canciones en cola no la necesitan y es lo que más ocupa de cada pista.
+        """
+        self.stream_url = None
+        self.expires_at = None
+        self.ext = None
+        self.acodec = None
+        self.abr = None
+        self.http_headers = _NO_HEADERS
+
+    @property
+    def is_local(self):
+        """Indica si se reproduce desde la caché local de audio"""
+        return self.local_path is not None and os.path.exists(self.local_path)
+
+    @property
+    def source_url(self):
+        """Entrada para FFmpeg: el archivo local si existe, si no la URL de stream"""
+        return self.local_path if self.is_local else self.stream_url
+
+    def is_stream_valid(self, margin=EXPIRY_MARGIN):
+        """Indica si la URL de stream existe y no caducará dentro del margen"""
+        if self.is_local:
+            return True
+        if not self.stream_url:
+            return False
+        if self.expires_at is None:
+            return True
+        return self.expires_at - margin > time.time()
+
+    def covers_playback(self, position=0.0, margin=EXPIRY_MARGIN):
+        """Indica si la URL seguirá valiendo hasta el final de la pista reproducida desde `position`
+
+        FFmpeg reconecta con la misma URL tras un corte: si caduca a mitad de la
+        canción, la reconexión falla aunque la URL fuera válida al empezar.
+        """
+        return self.is_stream_valid(margin + max(0.0, (self.duration or 0) - position))